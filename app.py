@@ -2,27 +2,86 @@
 # app.py — Refeitório migrado para Supabase Auth + profiles (Free / Premium por unidade)
 # --------------------------------------------------------------
 import os
+import contextvars
+import copy
 import datetime
+import hashlib
+import io
+import json
+import logging
 import re
-import unicodedata
-from pathlib import Path
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from PIL import Image, ImageOps
+
+import metricas
+from metricas import RepositorioInstrumentado
+from repositorio import (
+    CotaExcedida,
+    ErroConfiguracao,
+    ObjetoJaExiste,
+    UsuarioJaExiste,
+    criar_repositorio,
+    motivo_cota_excedida,
+    sem_acentos,
+)
+from resiliencia import RepositorioResiliente
+from importacao import ErroImportacao, importar_cardapios, ler_planilha
+from snapshots import CAMPOS_EXIBIDOS, NOMES_DIAS, caminho_snapshot, montar_snapshot, publicar_snapshot, renderizar_semana, src_embutido
+
+# Streamlit reexecuta este arquivo a cada interação; st.cache_resource mantém
+# uma única instância por processo, compartilhada entre todas as sessões.
+@st.cache_resource
+def _carregar_ambiente():
+    load_dotenv()
+
+# Supabase (padrão) ou SQLite local — ver repositorio.py / CARDAPIO_BACKEND.
+# Um client (e um pool de conexões) por processo; a sessão de cada usuário
+# fica em st.session_state. Toda chamada passa por RepositorioInstrumentado
+# (métricas) e RepositorioResiliente (retentativas, circuit breaker e cópia
+# local das leituras; ver resiliencia.py).
+@st.cache_resource
+def _repositorio():
+    return RepositorioInstrumentado(RepositorioResiliente(criar_repositorio()))
+
+_carregar_ambiente()
+
+try:
+    repo = _repositorio()
+except ErroConfiguracao as e:
+    st.error(f"❌ {e}")
+    st.stop()
 
-load_dotenv()
+UNIDADE_CACHE_TTL = int(os.getenv("UNIDADE_CACHE_TTL", "600"))  # segundos
+CARDAPIO_CACHE_TTL = int(os.getenv("CARDAPIO_CACHE_TTL", "300"))  # segundos
+CARDAPIO_CACHE_MAX = int(os.getenv("CARDAPIO_CACHE_MAX", "512"))  # semanas (unidade, semana) em memória
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # public anon key
-SERVICE_ROLE_KEY = os.getenv("SERVICE_ROLE_KEY")  # ONLY for admin functions
+DIAS = ["segunda", "terca", "quarta", "quinta", "sexta"]
+CATEGORIAS = ["Almoço", "Jantar"]
+CAMPOS_CARDAPIO = ["guarnicao", "proteina", "salada", "sobremesa"]
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    st.error("❌ SUPABASE_URL e/ou SUPABASE_KEY não configurados.")
-    st.stop()
+TAMANHO_PAGINA_USUARIOS = 25
+TAMANHO_PAGINA_AVISOS = 10
+TAMANHO_PAGINA_BUSCA = 20
+IMPORTACAO_LOTE = 500  # linhas por upsert na importação em lote
+
+AVISOS_LIMITE = int(os.getenv("AVISOS_LIMITE", "5"))  # avisos exibidos no cardápio por unidade
+AVISOS_ARQUIVAR_SEGUNDOS = 3600  # intervalo entre arquivamentos dos avisos vencidos
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-BUCKET = "cardapio"
+AVISOS_POLL_SEGUNDOS = int(os.getenv("AVISOS_POLL_SEGUNDOS", "15"))  # intervalo do feed de avisos
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))  # uploads simultâneos por processo
+
+# Variantes geradas no upload (maior lado, em px). A miniatura é exibida com
+# width=120 em tela_usuario; 240px cobre telas de alta densidade.
+IMAGEM_MINIATURA_PX = 240
+IMAGEM_MEDIA_PX = 1024
+IMAGEM_QUALIDADE = 80
 
 # -------------------- HELPERS --------------------
 def segunda_da_semana(data: datetime.date):
@@ -39,17 +98,186 @@ def chave_semana(segunda):
     return segunda.strftime("%Y-%m-%d")
 
 def sanitize_filename(text: str):
-    text = unicodedata.normalize("NFD", text)
-    text = text.encode("ascii", "ignore").decode("utf-8")
-    text = re.sub(r"[^a-zA-Z0-9_\-]", "_", text)
-    return text
+    return re.sub(r"[^a-zA-Z0-9_\-]", "_", sem_acentos(text))
+
+# -------------------- CACHE --------------------
+_AUSENTE = object()
+
+class _Carga:
+    """Carga em andamento de uma chave: quem espera por ela e a época, que
+    invalidar() avança para descartar o resultado de uma carga já iniciada."""
+    __slots__ = ("lock", "esperando", "epoca")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.esperando = 0
+        self.epoca = 0
+
+class CacheTTL:
+    """Cache em memória com expiração por entrada e limite de tamanho (LRU)."""
+
+    def __init__(self, ttl, max_entradas=1024):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.lock = threading.RLock()
+        self._dados = OrderedDict()
+        self._cargas = {}  # chave -> _Carga, enquanto alguém carrega ou espera
+
+    def get(self, chave, padrao=None):
+        with self.lock:
+            entrada = self._dados.get(chave, _AUSENTE)
+            if entrada is _AUSENTE:
+                return padrao
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._dados[chave]
+                return padrao
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        with self.lock:
+            self._dados[chave] = (valor, time.monotonic() + self.ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    def _entrar(self, chave):
+        with self.lock:
+            carga = self._cargas.get(chave)
+            if carga is None:
+                carga = self._cargas[chave] = _Carga()
+            carga.esperando += 1
+            return carga
+
+    def _sair(self, chave, carga):
+        # Só o último a sair remove a carga: quem chega depois ainda encontra o
+        # mesmo lock e espera, em vez de disparar uma segunda carga
+        with self.lock:
+            carga.esperando -= 1
+            if carga.esperando == 0:
+                del self._cargas[chave]
+
+    def _set_se_vigente(self, chave, valor, carga, epoca):
+        with self.lock:
+            if carga.epoca == epoca:
+                self.set(chave, valor)
+
+    def obter_ou_carregar(self, chave, carregar):
+        """Devolve o valor em cache ou chama carregar() uma única vez por chave,
+        mesmo com várias sessões pedindo a mesma chave ao mesmo tempo.
+        Resultados None não são guardados, nem o de uma carga durante a qual
+        a chave foi invalidada (pode ter lido o banco antes da alteração)."""
+        valor = self.get(chave, _AUSENTE)
+        if valor is not _AUSENTE:
+            return valor
+        carga = self._entrar(chave)
+        try:
+            with carga.lock:
+                valor = self.get(chave, _AUSENTE)
+                if valor is _AUSENTE:
+                    with self.lock:
+                        epoca = carga.epoca
+                    valor = carregar()
+                    if valor is not None:
+                        self._set_se_vigente(chave, valor, carga, epoca)
+                return valor
+        finally:
+            self._sair(chave, carga)
+
+    def obter_ou_carregar_varios(self, chaves, carregar):
+        """Como obter_ou_carregar, para várias chaves numa carga só:
+        carregar(faltando) devolve {chave: valor} das chaves fora do cache."""
+        resultado = {c: self.get(c, _AUSENTE) for c in chaves}
+        faltando = sorted(c for c, v in resultado.items() if v is _AUSENTE)
+        if not faltando:
+            return resultado
+        # Locks sempre na mesma ordem: duas cargas com chaves em comum não se travam
+        cargas = [(c, self._entrar(c)) for c in faltando]
+        adquiridos = []
+        try:
+            for _, carga in cargas:
+                carga.lock.acquire()
+                adquiridos.append(carga)
+            pendentes = []
+            with self.lock:
+                for c, carga in cargas:
+                    resultado[c] = self.get(c, _AUSENTE)
+                    if resultado[c] is _AUSENTE:
+                        pendentes.append((c, carga, carga.epoca))
+            if pendentes:
+                valores = carregar([c for c, _, _ in pendentes])
+                for c, carga, epoca in pendentes:
+                    resultado[c] = valores.get(c)
+                    if resultado[c] is not None:
+                        self._set_se_vigente(c, resultado[c], carga, epoca)
+            return resultado
+        finally:
+            for carga in adquiridos:
+                carga.lock.release()
+            for c, carga in cargas:
+                self._sair(c, carga)
+
+    def invalidar(self, chave=_AUSENTE):
+        with self.lock:
+            if chave is _AUSENTE:
+                self._dados.clear()
+                cargas = self._cargas.values()
+            else:
+                self._dados.pop(chave, None)
+                cargas = [self._cargas[chave]] if chave in self._cargas else []
+            for carga in cargas:
+                carga.epoca += 1
+
+@st.cache_resource
+def _cache_unidades():
+    return CacheTTL(ttl=UNIDADE_CACHE_TTL)
+
+@st.cache_resource
+def _cache_cardapios():
+    return CacheTTL(ttl=CARDAPIO_CACHE_TTL, max_entradas=CARDAPIO_CACHE_MAX)
+
+@st.cache_resource
+def _cache_html_semanas():
+    return CacheTTL(ttl=CARDAPIO_CACHE_TTL, max_entradas=CARDAPIO_CACHE_MAX)
+
+@st.cache_resource
+def _prefetches_em_andamento():
+    # Evita que várias sessões disparem o mesmo prefetch ao mesmo tempo
+    return CacheTTL(ttl=30)
+
+@st.cache_resource
+def _pool_prefetch():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+@st.cache_resource
+def _imagens_conhecidas():
+    # Hashes cujas variantes já existem no bucket: evita até a consulta de existência
+    return CacheTTL(ttl=24 * 3600, max_entradas=4096)
+
+@st.cache_resource
+def _pool_uploads():
+    return ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+@st.cache_resource
+def _pool_snapshots():
+    # Um worker: snapshots da mesma semana nunca são gravados fora de ordem
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+
+@st.cache_resource
+def _snapshots_pendentes():
+    return CacheTTL(ttl=300)
+
+@st.cache_resource
+def _snapshots_atuais():
+    # unidade -> semana publicada como atual.html por este processo
+    return CacheTTL(ttl=24 * 3600)
 
 # -------------------- DB WRAPPERS --------------------
 def listar_unidades():
     try:
-        resp = supabase.table("unidades").select("nome, plano").order("nome").execute()
-        return resp.data or []
-    except:
+        return repo.listar_unidades()
+    except Exception:
         return []
 
 def criar_unidade(nome, plano="free"):
@@ -57,211 +285,608 @@ def criar_unidade(nome, plano="free"):
         nm = nome.strip()
         if not nm:
             return
-        exist = supabase.table("unidades").select("id").eq("nome", nm).limit(1).execute()
-        if exist.data:
-            return
-        supabase.table("unidades").insert({"nome": nm, "plano": plano}).execute()
+        repo.garantir_unidade(nm, plano)
+        _cache_unidades().invalidar(nm)
     except Exception:
         pass
 
 def get_unidade_id(nome):
-    try:
-        if not nome:
-            return None
-        resp = supabase.table("unidades").select("id").eq("nome", nome).execute()
-        if resp.data:
-            return resp.data[0]["id"]
-        novo = supabase.table("unidades").insert({"nome": nome}).execute()
-        if novo.data:
-            return novo.data[0]["id"]
+    if not nome:
         return None
-    except:
+    # Sessões simultâneas pedindo a mesma unidade disparam um único lookup/insert
+    try:
+        return _cache_unidades().obter_ou_carregar(nome, lambda: repo.garantir_unidade(nome))
+    except Exception:
         return None
 
-def salvar_cardapio(unidade, semana, dia, categoria,
-                    guarnicao, proteina, salada, sobremesa, imagem_url):
+MSG_CONFLITO = "Alterado por outro administrador depois que você abriu a semana. Recarregue para ver a versão atual."
 
-    unidade_id = get_unidade_id(unidade)
-    if not unidade_id:
-        return
+def salvar_cardapio_semana(unidade, semana, grade, versionado=False):
+    """Grava a grade {dia: {categoria: campos}} da semana em um único upsert.
 
-    busca = supabase.table("cardapios").select("id").match({
-        "unidade_id": unidade_id,
-        "semana_inicio": semana,
-        "dia_semana": dia,
-        "categoria": categoria
-    }).execute()
-
-    payload = {
-        "guarnicao": guarnicao,
-        "proteina": proteina,   # prato principal
-        "salada": salada,
-        "sobremesa": sobremesa,
-        "imagem_url": imagem_url,
-        "criado_em": datetime.datetime.utcnow().isoformat()
-    }
+    Células sem nenhum campo preenchido e sem imagem são ignoradas. Retorna (gravadas, erros),
+    onde erros é uma lista de (dia, categoria, mensagem).
 
-    if busca.data:
-        supabase.table("cardapios").update(payload).eq("id", busca.data[0]["id"]).execute()
-    else:
-        payload.update({
-            "unidade_id": unidade_id,
-            "semana_inicio": semana,
-            "dia_semana": dia,
-            "categoria": categoria
-        })
-        supabase.table("cardapios").insert(payload).execute()
-
-
-def buscar_cardapio_semana(unidade, semana):
+    Com versionado=True, cada célula leva a "versao" lida quando a semana foi
+    aberta (None se ainda não existia) e só é gravada se ninguém a alterou
+    nesse meio tempo; as demais voltam como erro de conflito. A nova versão
+    de cada célula gravada é escrita de volta em item["versao"].
+    """
     unidade_id = get_unidade_id(unidade)
     if not unidade_id:
-        return {}
+        return 0, [(None, None, f"Unidade '{unidade}' não encontrada.")]
+
+    erros = []
+    linhas = []
+    agora = datetime.datetime.utcnow().isoformat()
+    for dia, bloco in grade.items():
+        if dia not in DIAS:
+            erros.append((dia, None, "Dia da semana inválido."))
+            continue
+        for categoria, item in bloco.items():
+            if categoria not in CATEGORIAS:
+                erros.append((dia, categoria, "Categoria inválida."))
+                continue
+            # Só a imagem já basta: uma foto enviada sem texto também é gravada
+            if not any(item.get(campo) for campo in CAMPOS_CARDAPIO + ["imagem"]):
+                continue
+            linhas.append({
+                "unidade_id": unidade_id,
+                "semana_inicio": semana,
+                "dia_semana": dia,
+                "categoria": categoria,
+                "guarnicao": item.get("guarnicao", ""),
+                "proteina": item.get("proteina", ""),   # prato principal
+                "salada": item.get("salada", ""),
+                "sobremesa": item.get("sobremesa", ""),
+                "imagem_url": item.get("imagem"),
+                "criado_em": agora
+            })
+            if versionado:
+                linhas[-1]["versao_esperada"] = item.get("versao")
+
+    if not linhas:
+        return 0, erros
+
+    # Uma única chamada/transação: um erro não deixa a semana gravada pela metade
+    try:
+        if versionado:
+            versoes = repo.salvar_cardapios_versionados(linhas)
+        else:
+            repo.upsert_cardapios(linhas)
+    except Exception as e:
+        erros.extend((l["dia_semana"], l["categoria"], f"Erro ao gravar: {e}") for l in linhas)
+        return 0, erros
+    finally:
+        _cache_cardapios().invalidar((unidade, semana))
+
+    if not versionado:
+        return len(linhas), erros
+
+    gravadas = 0
+    for l in linhas:
+        nova_versao = versoes.get((semana, l["dia_semana"], l["categoria"]))
+        if nova_versao is None:
+            erros.append((l["dia_semana"], l["categoria"], MSG_CONFLITO))
+        else:
+            grade[l["dia_semana"]][l["categoria"]]["versao"] = nova_versao
+            gravadas += 1
+    return gravadas, erros
 
-    resp = supabase.table("cardapios").select("*").match({
-        "unidade_id": unidade_id,
-        "semana_inicio": semana
-    }).execute()
+def replicar_semana(unidade, semana, unidades_destino, semanas_destino, sobrescrever=False):
+    """Copia a semana (como está gravada) para cada unidade × semana de destino
+    em uma única chamada ao banco. Retorna quantas células foram gravadas."""
+    unidade_id = get_unidade_id(unidade)
+    alvos = [(nome, get_unidade_id(nome), s) for nome in unidades_destino for s in semanas_destino]
+    destinos = [{"unidade_id": uid, "semana_inicio": s} for _, uid, s in alvos if uid]
+    if not unidade_id or not destinos:
+        return 0
+    try:
+        return repo.replicar_semana(unidade_id, semana, destinos, sobrescrever)
+    finally:
+        cache = _cache_cardapios()
+        for nome, _, s in alvos:
+            cache.invalidar((nome, s))
+            agendar_snapshot(nome, datetime.date.fromisoformat(s))
 
+
+def _agrupar_por_dia(linhas):
     dias = {}
-    for r in resp.data or []:
+    for r in linhas:
         dias.setdefault(r["dia_semana"], {})[r["categoria"]] = {
             "guarnicao": r.get("guarnicao", ""),
             "proteina": r.get("proteina", ""),  # prato principal
             "salada": r.get("salada", ""),
             "sobremesa": r.get("sobremesa", ""),
-            "imagem": r.get("imagem_url")
+            "imagem": r.get("imagem_url"),
+            "versao": r.get("versao")
         }
     return dias
 
+def _carregar_cardapio_semana(unidade, semana):
+    unidade_id = get_unidade_id(unidade)
+    if not unidade_id:
+        return None
+    return _agrupar_por_dia(repo.buscar_cardapios(unidade_id, semana))
+
+def _semana_do_cache(cache, unidade, unidade_id, semana):
+    # Como buscar_cardapio_semana, sem st.* (roda também nas threads dos pools) e sem cópia
+    return cache.obter_ou_carregar(
+        (unidade, semana), lambda: _agrupar_por_dia(repo.buscar_cardapios(unidade_id, semana))
+    )
+
+def buscar_cardapio_semana(unidade, semana):
+    # Cache compartilhado entre sessões; salvar_cardapio_semana invalida a entrada
+    dias = _cache_cardapios().obter_ou_carregar(
+        (unidade, semana), lambda: _carregar_cardapio_semana(unidade, semana)
+    )
+    # Cópia: quem chama pode alterar o dicionário sem afetar as outras sessões
+    return copy.deepcopy(dias) if dias else {}
+
+def _semanas_do_intervalo(cache, unidade, unidade_id, segundas):
+    """{semana: {dia: {categoria: campos}}} das `segundas`, vindas do cache ou
+    de uma única consulta ao intervalo das que faltam (que ficam no cache).
+    Não usa st.*: roda também nas threads de prefetch."""
+    def carregar(faltando):
+        semanas = sorted(semana for _, semana in faltando)
+        linhas = repo.buscar_cardapios_intervalo(unidade_id, semanas[0], semanas[-1])
+        por_semana = {semana: [] for semana in semanas}
+        for r in linhas:
+            semana = str(r["semana_inicio"])[:10]
+            if semana in por_semana:
+                por_semana[semana].append(r)
+        return {(unidade, semana): _agrupar_por_dia(l) for semana, l in por_semana.items()}
+
+    chaves = [(unidade, chave_semana(s)) for s in segundas]
+    return {semana: dias for (_, semana), dias in cache.obter_ou_carregar_varios(chaves, carregar).items()}
+
+def buscar_cardapios_intervalo(unidade, data_ini, data_fim):
+    """Cardápios de todas as semanas entre as duas datas em uma única consulta.
+
+    Devolve {semana: {dia: {categoria: campos}}}, com todas as semanas do
+    intervalo presentes (vazias inclusive); as que já estavam no cache semanal
+    não são relidas e as lidas ficam nele.
+    """
+    unidade_id = get_unidade_id(unidade)
+    if not unidade_id:
+        return {}
+
+    segundas = []
+    segunda = segunda_da_semana(data_ini)
+    while segunda <= segunda_da_semana(data_fim):
+        segundas.append(segunda)
+        segunda += datetime.timedelta(days=7)
+    semanas = _semanas_do_intervalo(_cache_cardapios(), unidade, unidade_id, segundas)
+    return copy.deepcopy(semanas)
+
+def prefetch_semanas_vizinhas(unidade, segunda):
+    """Carrega em segundo plano a semana anterior e a seguinte, se não estiverem no cache."""
+    cache = _cache_cardapios()
+    vizinhas = [segunda - datetime.timedelta(days=7), segunda + datetime.timedelta(days=7)]
+    faltando = [s for s in vizinhas if cache.get((unidade, chave_semana(s))) is None]
+    if not faltando:
+        return
+
+    em_andamento = _prefetches_em_andamento()
+    marcador = (unidade, chave_semana(segunda))
+    with em_andamento.lock:
+        if em_andamento.get(marcador):
+            return
+        em_andamento.set(marcador, True)
+
+    # Singletons st.cache_resource resolvidos aqui, na thread do script: a do
+    # pool não tem ScriptRunContext
+    unidade_id = get_unidade_id(unidade)
+    pool = _pool_prefetch()
+    if not unidade_id:
+        em_andamento.invalidar(marcador)
+        return
+
+    def carregar():
+        try:
+            # Uma consulta para o intervalo inteiro (anterior .. seguinte), pelo
+            # mesmo caminho single-flight das leituras: uma invalidação durante
+            # a consulta descarta o resultado
+            _semanas_do_intervalo(cache, unidade, unidade_id, faltando)
+        finally:
+            em_andamento.invalidar(marcador)
+
+    pool.submit(carregar)
+
 
 # Avisos
-def criar_aviso(unidade_nome, titulo, mensagem):
+def _aviso_vigente(aviso, hoje):
+    return not aviso.get("valido_ate") or str(aviso["valido_ate"])[:10] >= hoje
+
+def _instante_utc(texto):
+    # Postgres devolve timestamptz com fuso; o SQLite guarda UTC sem fuso
+    instante = datetime.datetime.fromisoformat(str(texto))
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return instante
+
+class FeedAvisos:
+    """Avisos ativos por unidade, mantidos em memória no processo.
+
+    Cada unidade é carregada uma vez, na primeira leitura. Depois disso, uma
+    thread consulta a cada `intervalo` segundos só o que mudou (avisos de todas
+    as unidades com atualizado_em recente) e aplica na lista: é uma consulta por
+    processo por intervalo, não uma por sessão a cada rerun. Criações e
+    desativações feitas por este processo entram na hora (write-through).
+
+    Só os `limite` avisos vigentes mais recentes de cada unidade ficam em
+    memória. Se a unidade tinha mais que isso no banco e algum sai da lista
+    (desativado ou vencido), ela é recarregada na próxima leitura.
+    """
+
+    # Janela relida a cada ciclo para tolerar diferença de relógio e commits atrasados
+    MARGEM = datetime.timedelta(seconds=60)
+
+    def __init__(self, repo, intervalo, limite):
+        self.repo = repo
+        self.intervalo = intervalo
+        self.limite = limite
+        self._lock = threading.Lock()
+        self._por_unidade = {}
+        self._truncadas = set()  # unidades com mais avisos no banco do que em memória
+        self._marca = datetime.datetime.utcnow()
+        self._ultimo_arquivamento = 0.0
+        self._thread = None
+
+    def avisos(self, unidade_id):
+        hoje = datetime.date.today().isoformat()
+        with self._lock:
+            unidade = self._por_unidade.get(unidade_id)
+            if unidade is not None and unidade_id in self._truncadas:
+                vigentes = sum(_aviso_vigente(a, hoje) for a in unidade.values())
+                if vigentes < self.limite:
+                    # Saiu algum da lista e há outros no banco para ocupar o lugar
+                    del self._por_unidade[unidade_id]
+                    unidade = None
+        if unidade is None:
+            linhas, proximo = self.repo.pagina_avisos(unidade_id, limite=self.limite)
+            with self._lock:
+                unidade = self._por_unidade.get(unidade_id)
+                if unidade is None:
+                    unidade = self._por_unidade[unidade_id] = {
+                        a["id"]: dict(a, unidade_id=unidade_id) for a in linhas
+                    }
+                    if proximo:
+                        self._truncadas.add(unidade_id)
+                    else:
+                        self._truncadas.discard(unidade_id)
+        self._iniciar()
+        # O dict desta leitura, não self._por_unidade[unidade_id]: recarregar() ou
+        # outra sessão podem ter tirado a unidade do índice no meio tempo
+        with self._lock:
+            avisos = [a for a in unidade.values() if _aviso_vigente(a, hoje)]
+        avisos.sort(key=lambda a: (str(a.get("criado_em")), a["id"]), reverse=True)
+        return avisos[:self.limite]
+
+    def aplicar(self, linhas):
+        with self._lock:
+            for aviso in linhas:
+                unidade = self._por_unidade.get(aviso["unidade_id"])
+                if unidade is None:
+                    continue  # unidade ainda não lida neste processo
+                if aviso.get("ativo"):
+                    unidade[aviso["id"]] = aviso
+                    self._aparar(aviso["unidade_id"], unidade)
+                else:
+                    unidade.pop(aviso["id"], None)
+
+    def _aparar(self, unidade_id, unidade):
+        # Mantém só os `limite` mais recentes; os que saem continuam no banco
+        if len(unidade) <= self.limite:
+            return
+        ordenados = sorted(unidade, key=lambda i: (str(unidade[i].get("criado_em")), i), reverse=True)
+        for aviso_id in ordenados[self.limite:]:
+            del unidade[aviso_id]
+        self._truncadas.add(unidade_id)
+
+    def recarregar(self):
+        # Próxima leitura de cada unidade volta ao banco
+        with self._lock:
+            self._por_unidade.clear()
+            self._truncadas.clear()
+
+    def descartar(self, aviso_id):
+        with self._lock:
+            for unidade in self._por_unidade.values():
+                unidade.pop(aviso_id, None)
+
+    def sincronizar(self):
+        if time.monotonic() - self._ultimo_arquivamento >= AVISOS_ARQUIVAR_SEGUNDOS:
+            self._ultimo_arquivamento = time.monotonic()
+            self.repo.arquivar_avisos_expirados()
+        desde = (self._marca - self.MARGEM).isoformat()
+        linhas = self.repo.avisos_alterados_desde(desde)
+        self.aplicar(linhas)
+        if linhas:
+            self._marca = max(self._marca, max(_instante_utc(l["atualizado_em"]) for l in linhas))
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="feed-avisos", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.sincronizar()
+            except Exception:
+                pass  # tenta de novo no próximo ciclo; as sessões seguem com a última lista
+
+@st.cache_resource
+def _feed_avisos():
+    return FeedAvisos(repo, AVISOS_POLL_SEGUNDOS, AVISOS_LIMITE)
+
+def criar_aviso(unidade_nome, titulo, mensagem, valido_ate=None):
     unidade_id = get_unidade_id(unidade_nome)
     if not unidade_id:
         return
-    supabase.table("avisos").insert({
+    aviso = repo.inserir_aviso({
         "unidade_id": unidade_id,
         "titulo": titulo,
         "mensagem": mensagem,
         "ativo": True,
-        "criado_em": datetime.datetime.utcnow().isoformat()
-    }).execute()
+        "criado_em": datetime.datetime.utcnow().isoformat(),
+        "valido_ate": valido_ate.isoformat() if valido_ate else None
+    })
+    if aviso:
+        _feed_avisos().aplicar([aviso])
+        agendar_snapshot(unidade_nome, segunda_da_semana(datetime.date.today()))
 
 def listar_avisos(unidade_nome):
+    # Lido da memória do processo e limitado a AVISOS_LIMITE; ver FeedAvisos
     unidade_id = get_unidade_id(unidade_nome)
     if not unidade_id:
         return []
-    resp = (
-        supabase.table("avisos")
-        .select("*")
-        .eq("unidade_id", unidade_id)
-        .eq("ativo", True)
-        .order("criado_em", desc=True)
-        .execute()
-    )
-    return resp.data or []
+    return _feed_avisos().avisos(unidade_id)
 
-def desativar_aviso(aviso_id):
-    supabase.table("avisos").update({"ativo": False}).eq("id", aviso_id).execute()
+def desativar_aviso(unidade_nome, aviso_id):
+    repo.desativar_aviso(aviso_id)
+    _feed_avisos().descartar(aviso_id)
+    agendar_snapshot(unidade_nome, segunda_da_semana(datetime.date.today()))
 
 # Upload imagem
-def salvar_imagem_upload(file_obj, prefix):
-    if not file_obj:
-        return None
-    try:
-        content = file_obj.read()
-        ext = Path(file_obj.name).suffix.lower()
-        ext_clean = ext.replace(".", "")
-        prefix_clean = sanitize_filename(prefix)
-        filename = f"{prefix_clean}_{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}{ext}"
-        unidade = prefix_clean.split("_")[0]
-        path = f"imagens/{unidade}/{filename}"
-
-        supabase.storage.from_(BUCKET).upload(
-            path=path,
-            file=content,
-            file_options={"content-type": f"image/{ext_clean}"}
-        )
+def processar_imagem(content):
+    """Gera as variantes "media" e "thumb" em WebP, já orientadas e sem EXIF."""
+    with Image.open(io.BytesIO(content)) as original:
+        # Em JPEG, decodifica direto numa escala reduzida (bem mais rápido para fotos de celular)
+        original.draft("RGB", (IMAGEM_MEDIA_PX, IMAGEM_MEDIA_PX))
+        img = ImageOps.exif_transpose(original)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+
+    variantes = {}
+    for nome, lado in (("media", IMAGEM_MEDIA_PX), ("thumb", IMAGEM_MINIATURA_PX)):
+        copia = img.copy()
+        copia.thumbnail((lado, lado), Image.LANCZOS)
+        buf = io.BytesIO()
+        # Sem o parâmetro exif=, o Pillow não grava metadados no arquivo gerado
+        copia.save(buf, format="WEBP", quality=IMAGEM_QUALIDADE, method=4)
+        variantes[nome] = buf.getvalue()
+    return variantes
+
+def _ler_arquivo(file_obj):
+    return file_obj.getvalue() if hasattr(file_obj, "getvalue") else file_obj.read()
+
+def _caminho_imagem(content):
+    # Endereçado pelo conteúdo: a mesma foto gera sempre o mesmo caminho,
+    # seja qual for a unidade, a semana ou o nome do arquivo enviado
+    digest = hashlib.sha256(content).hexdigest()
+    return f"imagens/{digest[:2]}/{digest}"
+
+def url_miniatura(url):
+    # Imagens antigas (enviadas antes do pipeline) não têm miniatura
+    if url and url.endswith("_media.webp"):
+        return url[: -len("_media.webp")] + "_thumb.webp"
+    return url
+
+def _imagem_existe(base):
+    pasta, nome = base.rsplit("/", 1)
+    nomes = set(repo.listar_objetos(pasta, nome))
+    return f"{nome}_media.webp" in nomes and f"{nome}_thumb.webp" in nomes
+
+def _enviar_imagem(content, base):
+    # Roda nas threads do pool: não pode chamar st.*
+    conhecidas = _imagens_conhecidas()
+    if conhecidas.get(base) or _imagem_existe(base):
+        conhecidas.set(base, True)
+        return f"{base}_media.webp"
+
+    for nome, dados in processar_imagem(content).items():
+        try:
+            repo.enviar_objeto(f"{base}_{nome}.webp", dados, "image/webp")
+        except ObjetoJaExiste:
+            # Outra sessão enviou os mesmos bytes no meio tempo: o objeto é idêntico
+            pass
+    conhecidas.set(base, True)
+    return f"{base}_media.webp"
+
+def _estado_celula(item):
+    return {campo: item.get(campo) for campo in CAMPOS_CARDAPIO + ["imagem"]}
+
+def celulas_alteradas(grade, original):
+    """Subconjunto {dia: {categoria: item}} da grade que difere do que foi carregado."""
+    alteradas = {}
+    for dia, bloco in grade.items():
+        for categoria, item in bloco.items():
+            mudou = _estado_celula(item) != original.get(dia, {}).get(categoria)
+            if mudou or item.get("img_file") is not None:
+                alteradas.setdefault(dia, {})[categoria] = item
+    return alteradas
+
+def salvar_semana_com_imagens(unidade, semana, grade):
+    """Salva a grade da semana enviando as imagens novas em paralelo à gravação.
+
+    Cada item da grade pode trazer "img_file" (arquivo novo) além de "imagem"
+    (URL atual). Os uploads rodam no pool do processo enquanto o upsert da semana
+    é feito com a imagem que cada célula já tinha; só as células cujo upload
+    terminou bem são regravadas, numa segunda chamada, com a URL nova. Nenhuma
+    linha aponta para um arquivo que ainda não existe, e um upload que falha
+    não afeta o restante do salvamento. As gravações são versionadas (ver
+    salvar_cardapio_semana).
+
+    Retorna (erros, status_uploads), com status_uploads como lista de
+    (dia, categoria, ok, mensagem).
+    """
+    pool = _pool_uploads()
+    uploads = {}
+    por_conteudo = {}  # a mesma foto em várias células é enviada uma vez só
+    for dia, bloco in grade.items():
+        for categoria, item in bloco.items():
+            file_obj = item.get("img_file")
+            if file_obj is None:
+                continue
+            content = _ler_arquivo(file_obj)
+            base = _caminho_imagem(content)
+            if base not in por_conteudo:
+                # copy_context: as chamadas do upload contam no rerun que o disparou
+                por_conteudo[base] = pool.submit(contextvars.copy_context().run, _enviar_imagem, content, base)
+            uploads[(dia, categoria)] = (por_conteudo[base], file_obj, repo.url_publica(f"{base}_media.webp"))
+
+    _, erros = salvar_cardapio_semana(unidade, semana, grade, versionado=True)
+    nao_gravadas = {(dia, categoria) for dia, categoria, _ in erros}
+
+    status_uploads = []
+    enviadas = {}
+    for (dia, categoria), (futuro, file_obj, url) in uploads.items():
+        item = grade[dia][categoria]
+        try:
+            futuro.result()
+        except Exception as e:
+            status_uploads.append((dia, categoria, False, f"Erro ao enviar imagem: {e}"))
+            continue
+        item["imagem"] = url
+        item["img_file"] = None
+        # O file_uploader continua com o arquivo nos próximos reruns; guardar o id
+        # evita que o mesmo arquivo volte a contar como alteração
+        item["img_enviada"] = getattr(file_obj, "file_id", None)
+        status_uploads.append((dia, categoria, True, "Imagem enviada."))
+        if (dia, categoria) not in nao_gravadas:
+            enviadas.setdefault(dia, {})[categoria] = item
+
+    # Com a versão devolvida pela primeira gravação (ver salvar_cardapio_semana)
+    if enviadas:
+        _, erros_imagens = salvar_cardapio_semana(unidade, semana, enviadas, versionado=True)
+        erros.extend(erros_imagens)
+
+    return erros, status_uploads
+
+# Snapshots estáticos da semana (ver snapshots.py)
+def _gerar_snapshot(unidade, unidade_id, segunda, cache, feed):
+    # Roda na thread do pool de snapshots: cache e feed vêm resolvidos de agendar_snapshot
+    chave = chave_semana(segunda)
+    snapshot = montar_snapshot(
+        unidade, chave, label_intervalo(segunda),
+        _semana_do_cache(cache, unidade, unidade_id, chave), feed.avisos(unidade_id),
+        DIAS, CATEGORIAS, src_imagem=url_miniatura
+    )
+    atual = segunda == segunda_da_semana(datetime.date.today())
+    publicar_snapshot(repo, sanitize_filename(unidade), snapshot, DIAS, CATEGORIAS, atual=atual)
 
-        public_url = f"{SUPABASE_URL}/storage/v1/object/public/{BUCKET}/{path}"
-        return public_url
-    except Exception as e:
-        st.error(f"Erro ao enviar imagem: {e}")
-        return None
+def agendar_snapshot(unidade, segunda):
+    """Regrava em segundo plano o HTML/JSON estático da semana da unidade."""
+    # Singletons st.cache_resource resolvidos aqui, na thread do script: a do
+    # pool não tem ScriptRunContext (como em prefetch_semanas_vizinhas)
+    unidade_id = get_unidade_id(unidade)
+    if not unidade_id:
+        return
+    pendentes = _snapshots_pendentes()
+    atuais = _snapshots_atuais()
+    cache = _cache_cardapios()
+    feed = _feed_avisos()
+    pool = _pool_snapshots()
+    marcador = (unidade, chave_semana(segunda))
+    if segunda == segunda_da_semana(datetime.date.today()):
+        atuais.set(unidade, marcador[1])
+    with pendentes.lock:
+        if pendentes.get(marcador):
+            return  # já há um na fila, que vai ler os dados mais novos
+        pendentes.set(marcador, True)
+
+    def gerar():
+        # Mudanças feitas a partir daqui agendam outro snapshot
+        pendentes.invalidar(marcador)
+        rerun = metricas.iniciar_rerun("(snapshot)")
+        try:
+            _gerar_snapshot(unidade, unidade_id, segunda, cache, feed)
+        except Exception:
+            # O snapshot anterior continua publicado; o próximo salvamento (ou
+            # a próxima leitura, para atual.html) tenta de novo
+            metricas.registro.registrar_falha("snapshot")
+            logging.getLogger(__name__).exception("Falha ao gerar o snapshot de %s, semana %s", *marcador)
+            with atuais.lock:
+                if atuais.get(unidade) == marcador[1]:
+                    atuais.invalidar(unidade)
+        finally:
+            metricas.encerrar_rerun(rerun)
+
+    # Contexto novo: o snapshot roda depois que o rerun que o agendou já foi
+    # contabilizado, então conta no seu próprio Rerun "(snapshot)"
+    pool.submit(contextvars.Context().run, gerar)
+
+def garantir_snapshot_atual(unidade):
+    """Agenda o snapshot da semana corrente se atual.html ainda não foi gerado
+    para ela neste processo: na virada da semana, a primeira leitura o atualiza."""
+    segunda = segunda_da_semana(datetime.date.today())
+    if _snapshots_atuais().get(unidade) != chave_semana(segunda):
+        agendar_snapshot(unidade, segunda)
+
+def url_snapshot(unidade, nome="atual.html"):
+    return repo.url_publica(caminho_snapshot(sanitize_filename(unidade), nome))
 
 # -------------------- AUTH / PROFILES --------------------
 def sign_in(email_or_usuario, senha):
-    email = email_or_usuario.strip()
-    if "@" not in email:
-        resp = supabase.table("profiles").select("email").ilike("usuario_text", email_or_usuario).execute()
-        if resp.data:
-            email = resp.data[0]["email"]
-        else:
-            return None, None
+    """Retorna (user, session, profile): uma consulta ao profile + a autenticação."""
+    identificador = email_or_usuario.strip()
+    profile = repo.buscar_profile_login(identificador)
+    if not profile and "@" not in identificador:
+        return None, None, None
+    email = profile["email"] if profile else identificador
 
     try:
-        auth_resp = supabase.auth.sign_in_with_password({"email": email, "password": senha})
-        return auth_resp.user, auth_resp.session
+        user, session = repo.autenticar(email, senha)
     except Exception:
-        return None, None
+        return None, None, None
+
+    # Email digitado com outra grafia que a do profile: busca pelo id autenticado
+    if not profile or str(profile["id"]) != str(user.id):
+        profile = get_profile(user.id)
+    return user, session, profile
 
 def get_profile(user_id):
     if not user_id:
         return None
-    resp = supabase.table("profiles").select("*").eq("id", str(user_id)).execute()
-    if resp.data:
-        return resp.data[0]
-    return None
+    return repo.buscar_profile(user_id)
 
-def get_unidade_plano(unidade_nome):
-    resp = supabase.table("unidades").select("plano").eq("nome", unidade_nome).execute()
-    if resp.data:
-        return resp.data[0].get("plano", "free")
-    return "free"
-
-def count_users_in_unidade(unidade_nome):
-    resp = supabase.table("profiles").select("id").eq("unidade", unidade_nome).execute()
-    return len(resp.data or [])
-
-def count_admin_unidade_in_unidade(unidade_nome):
-    resp = supabase.table("profiles").select("id").eq("unidade", unidade_nome).eq("role", "admin_unidade").execute()
-    return len(resp.data or [])
+def consultar_cota(unidade_nome):
+    # Plano, total de usuários e de admin_unidade (contados no banco) e limites do plano
+    return repo.consultar_cota(unidade_nome)
 
 def create_user_via_service_role(email, password, usuario_text, role, unidade):
-    if not SERVICE_ROLE_KEY:
-        return False, "SERVICE_ROLE_KEY não configurada."
-
-    import requests, json
-    url = SUPABASE_URL.rstrip("/") + "/auth/v1/admin/users"
-    headers = {
-        "apikey": SERVICE_ROLE_KEY,
-        "Authorization": f"Bearer {SERVICE_ROLE_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "email": email,
-        "password": password,
-        "email_confirm": True,
-        "user_metadata": {"usuario_text": usuario_text}
-    }
-
-    r = requests.post(url, headers=headers, data=json.dumps(payload))
-    if r.status_code not in (200, 201):
-        return False, f"Erro criando auth user: {r.status_code} {r.text}"
-
-    user = r.json()
-    user_id = user.get("id")
+    ok, resultado = repo.criar_usuario_auth(email, password, {"usuario_text": usuario_text})
+    if not ok:
+        return False, resultado
 
     try:
-        supabase.table("profiles").insert({
-            "id": user_id,
+        repo.inserir_profile({
+            "id": resultado,
             "email": email,
             "usuario_text": usuario_text,
             "role": role,
             "unidade": unidade
-        }).execute()
+        })
+    except (CotaExcedida, UsuarioJaExiste) as e:
+        # Cota: outro admin criou um usuário entre a conferência e o insert
+        repo.excluir_usuario_auth(resultado)
+        return False, str(e)
     except Exception as e:
+        repo.excluir_usuario_auth(resultado)
         return False, f"Erro ao inserir profile: {e}"
 
     return True, "Usuário criado com sucesso."
@@ -289,14 +914,13 @@ def tela_login():
     senha = st.text_input("Senha", type="password")
 
     if st.button("Entrar"):
-        user, session = sign_in(usuario.strip(), senha)
+        user, session, profile = sign_in(usuario.strip(), senha)
         if not user:
             st.error("Usuário ou senha incorretos.")
         else:
             st.session_state.user = user
             st.session_state.session = session
 
-            profile = get_profile(user.id)
             st.session_state.perfil = profile["role"] if profile else "user"
             st.session_state.unidade_user = profile.get("unidade") if profile else ""
             st.session_state.usuario = profile.get("usuario_text") or user.email
@@ -308,7 +932,7 @@ def tela_login():
 def selecionar_unidade():
     st.sidebar.subheader("Unidade / Refeitório")
 
-    unidades = supabase.table("unidades").select("id, nome, plano").order("nome").execute().data or []
+    unidades = repo.listar_unidades()
     unidades_nomes = [u["nome"] for u in unidades]
 
     if st.session_state.perfil == "admin":
@@ -336,7 +960,7 @@ def selecionar_unidade():
             )
 
             if st.sidebar.button("Salvar novo plano"):
-                supabase.table("unidades").update({"plano": novo_plano}).eq("id", unidade_sel["id"]).execute()
+                repo.atualizar_plano(unidade_sel["id"], novo_plano)
                 st.success("Plano atualizado!")
                 st.rerun()
 
@@ -356,6 +980,30 @@ def selecionar_semana_ui():
     st.markdown(f"### 📅 {label}")
     return segunda, chave, label
 
+def html_semana(unidade, semana, dados):
+    """HTML da semana (ver snapshots.renderizar_semana), refeito só quando os dados mudam."""
+    digest = hashlib.sha256(json.dumps(dados, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    cache = _cache_html_semanas()
+    guardado = cache.get((unidade, semana))
+    if guardado and guardado[0] == digest:
+        return guardado[1]
+    # Miniaturas com loading="lazy"; no backend SQLite o arquivo local vira data URI
+    html = renderizar_semana(dados, DIAS, CATEGORIAS, src_imagem=lambda url: src_embutido(url_miniatura(url)))
+    cache.set((unidade, semana), (digest, html))
+    return html
+
+# Reexecuta sozinho a cada ciclo do feed: avisos novos ou desativados aparecem
+# nas telas abertas sem interação e sem consulta ao banco (lê da memória)
+@st.fragment(run_every=AVISOS_POLL_SEGUNDOS)
+@metricas.medir_fragmento("Visualizar Cardápio")
+def bloco_avisos(unidade):
+    avisos = listar_avisos(unidade)
+    if avisos:
+        st.markdown("## 🔔 Avisos do Refeitório")
+        for av in avisos:
+            st.info(f"**{av['titulo']}**\n\n{av['mensagem']}")
+        st.markdown("---")
+
 def tela_usuario(unidade):
     if not unidade:
         st.info("Selecione uma unidade.")
@@ -363,53 +1011,16 @@ def tela_usuario(unidade):
 
     st.title("📘 Cardápio da Semana")
 
-    avisos = listar_avisos(unidade)
-    if avisos:
-        st.markdown("## 🔔 Avisos do Refeitório")
-        for av in avisos:
-            st.info(f"**{av['titulo']}**\n\n{av['mensagem']}")
-        st.markdown("---")
+    bloco_avisos(unidade)
 
     segunda, chave, label = selecionar_semana_ui()
     dados = buscar_cardapio_semana(unidade, chave)
+    # Quem troca de semana quase sempre vai para a anterior ou a seguinte
+    prefetch_semanas_vizinhas(unidade, segunda)
+    garantir_snapshot_atual(unidade)
 
-    dias = ["segunda", "terca", "quarta", "quinta", "sexta"]
-    nomes = {
-        "segunda": "Segunda-feira",
-        "terca": "Terça-feira",
-        "quarta": "Quarta-feira",
-        "quinta": "Quinta-feira",
-        "sexta": "Sexta-feira",
-    }
-    categorias = ["Almoço", "Jantar"]
-
-    for d in dias:
-        st.subheader(nomes[d])
-        bloco = dados.get(d, {})
-        if not bloco:
-            st.write("_Sem informações cadastradas_")
-        else:
-            for c in categorias:
-                item = bloco.get(c)
-                if not item:
-                    st.write(f"• {c}: _não definido_")
-                    continue
-                col1, col2 = st.columns([1, 3])
-                if item["imagem"]:
-                    try:
-                        col1.image(item["imagem"], width=120)
-                    except Exception:
-                        pass
-               
-                col2.markdown(
-                    f"**{c}**<br>"
-                    f"**Guarnição:** {item['guarnicao']}<br>"
-                    f"**Prato principal:** {item['proteina']}<br>"
-                    f"**Salada:** {item.get('salada', '')}<br>"
-                    f"**Sobremesa:** {item['sobremesa']}",
-                    unsafe_allow_html=True
-)                
-        st.markdown("---")
+    # Um único elemento para a semana inteira, em vez de colunas/imagem/texto por célula
+    st.markdown(html_semana(unidade, chave, dados), unsafe_allow_html=True)
 
 def tela_admin(unidade):
     if not unidade:
@@ -419,72 +1030,124 @@ def tela_admin(unidade):
     st.title("🛠️ Administração do Cardápio")
 
     segunda, chave, label = selecionar_semana_ui()
-    dias = ["segunda", "terca", "quarta", "quinta", "sexta"]
-    categorias = ["Almoço", "Jantar"]
-    key_temp = f"tmp_{unidade}_{chave}"
-
-    if key_temp not in st.session_state:
-        origem = buscar_cardapio_semana(unidade, chave)
-        st.session_state[key_temp] = {
-            d: {
-                c: {
-                    "guarnicao": origem.get(d, {}).get(c, {}).get("guarnicao", ""),
-                    "proteina": origem.get(d, {}).get(c, {}).get("proteina", ""),
-                    "salada": origem.get(d, {}).get(c, {}).get("salada", ""),
-                    "sobremesa": origem.get(d, {}).get(c, {}).get("sobremesa", ""),
-                    "imagem": origem.get(d, {}).get(c, {}).get("imagem", None),
-                    "img_file": None
-                }
-                for c in categorias
-            }
-            for d in dias
-        }
+    garantir_snapshot_atual(unidade)
 
-    with st.form("form_cardapio"):
-        for d in dias:
-            st.subheader(f"📌 {d.capitalize()}")
-            for c in categorias:
-                st.markdown(f"**{c}**")
-                temp = st.session_state[key_temp][d][c]
-
-                temp["guarnicao"] = st.text_input(f"Guarnição ({d}-{c})", temp["guarnicao"])
-                temp["proteina"] = st.text_input(f"Prato principal ({d}-{c})", temp["proteina"])
-                temp["salada"] = st.text_input(f"Salada ({d}-{c})", temp["salada"])
-                temp["sobremesa"] = st.text_input(f"Sobremesa ({d}-{c})", temp["sobremesa"])
+    st.caption(f"📺 Página estática desta semana (TVs / QR code): {url_snapshot(unidade, f'{chave}.html')}")
 
+    with st.expander("📋 Replicar esta semana para outras unidades / semanas"):
+        st.caption("Copia o cardápio gravado desta semana, com as imagens. Alterações ainda não salvas não entram.")
+        if st.session_state.perfil == "admin":
+            nomes_unidades = [u["nome"] for u in listar_unidades()]
+        else:
+            nomes_unidades = [st.session_state.unidade_user]
+        opcoes_semanas = [chave_semana(segunda + datetime.timedelta(days=7 * i)) for i in range(13)]
+        with st.form("form_replicar"):
+            unidades_destino = st.multiselect("Unidades de destino", nomes_unidades, default=[unidade])
+            semanas_destino = st.multiselect(
+                "Semanas de destino", opcoes_semanas, default=[chave],
+                format_func=lambda s: label_intervalo(datetime.date.fromisoformat(s))
+            )
+            sobrescrever = st.radio(
+                "Se o destino já tiver cardápio", ["Manter o existente", "Sobrescrever"], horizontal=True
+            ) == "Sobrescrever"
+            replicar = st.form_submit_button("📋 Replicar")
+        if replicar:
+            try:
+                gravadas = replicar_semana(unidade, chave, unidades_destino, semanas_destino, sobrescrever)
+            except Exception as e:
+                st.error(f"Erro ao replicar: {e}")
+            else:
+                st.success(f"{gravadas} células gravadas.")
+
+    for d in DIAS:
+        editor_dia(unidade, segunda, d)
+
+def _celula_editor(item):
+    return {
+        "guarnicao": item.get("guarnicao", ""),
+        "proteina": item.get("proteina", ""),
+        "salada": item.get("salada", ""),
+        "sobremesa": item.get("sobremesa", ""),
+        "imagem": item.get("imagem"),
+        "versao": item.get("versao"),
+        "img_file": None
+    }
 
-                img = st.file_uploader(
-                    f"Imagem ({d}-{c})",
-                    type=["jpg", "jpeg", "png"],
-                    key=f"img_{unidade}_{chave}_{d}_{c}"
-                )
-                if img:
-                    temp["img_file"] = img
+# Cada dia é um fragmento com o próprio formulário: salvar a terça reexecuta só
+# a terça, sem refazer a página (seletor de unidade, outros dias) nem reenviar
+# os campos e uploaders dos outros dias
+@st.fragment
+@metricas.medir_fragmento("Administrar")
+def editor_dia(unidade, segunda, dia):
+    chave = chave_semana(segunda)
+    semana_temp = st.session_state.setdefault(f"tmp_{unidade}_{chave}", {})
+    semana_orig = st.session_state.setdefault(f"orig_{unidade}_{chave}", {})  # como estava ao ser carregado
+    key_conflito = f"conflito_{unidade}_{chave}_{dia}"
+    nome_dia = NOMES_DIAS[dia]
+
+    if dia not in semana_temp:
+        origem = buscar_cardapio_semana(unidade, chave).get(dia, {})
+        semana_temp[dia] = {c: _celula_editor(origem.get(c, {})) for c in CATEGORIAS}
+        semana_orig[dia] = {c: _estado_celula(item) for c, item in semana_temp[dia].items()}
+
+    with st.form(f"form_cardapio_{dia}"):
+        st.subheader(f"📌 {nome_dia}")
+        for c in CATEGORIAS:
+            st.markdown(f"**{c}**")
+            temp = semana_temp[dia][c]
+
+            temp["guarnicao"] = st.text_input(f"Guarnição ({dia}-{c})", temp["guarnicao"])
+            temp["proteina"] = st.text_input(f"Prato principal ({dia}-{c})", temp["proteina"])
+            temp["salada"] = st.text_input(f"Salada ({dia}-{c})", temp["salada"])
+            temp["sobremesa"] = st.text_input(f"Sobremesa ({dia}-{c})", temp["sobremesa"])
+
+            img = st.file_uploader(
+                f"Imagem ({dia}-{c})",
+                type=["jpg", "jpeg", "png"],
+                key=f"img_{unidade}_{chave}_{dia}_{c}"
+            )
+            if img and img.file_id != temp.get("img_enviada"):
+                temp["img_file"] = img
 
-        salvar = st.form_submit_button("💾 Salvar Cardápio")
+        salvar = st.form_submit_button(f"💾 Salvar {nome_dia}")
 
     if salvar:
-        for d in dias:
-            for c in categorias:
-                item = st.session_state[key_temp][d][c]
-                img_url = item.get("imagem")
-
-                if item["img_file"] is not None:
-                    prefix = f"{unidade}_{chave}_{d}_{c}"
-                    img_url = salvar_imagem_upload(item["img_file"], prefix)
-                    item["imagem"] = img_url
-
-                if any([item["guarnicao"], item["proteina"], item["salada"], item["sobremesa"]]):                                
-                    salvar_cardapio(unidade, chave, d, c,
-                                    item["guarnicao"],
-                                    item["proteina"],   # prato principal
-                                    item["salada"],
-                                    item["sobremesa"],
-                                    img_url)
-
-
-        st.success(f"Cardápio da {label} salvo com sucesso!")
-        st.rerun()
+        alteradas = celulas_alteradas({dia: semana_temp[dia]}, semana_orig)
+        if not alteradas:
+            st.info("Nenhuma alteração para salvar.")
+        else:
+            erros, status_uploads = salvar_semana_com_imagens(unidade, chave, alteradas)
+            agendar_snapshot(unidade, segunda)
+
+            # O que foi gravado passa a ser a nova referência para o próximo diff
+            nao_gravadas = {(d, c) for d, c, _ in erros}
+            for c, item in alteradas[dia].items():
+                if (dia, c) not in nao_gravadas:
+                    semana_orig[dia][c] = _estado_celula(item)
+
+            for _, c, ok, msg in status_uploads:
+                if not ok:
+                    st.warning(f"{c}: {msg}")
+
+            if erros:
+                st.error(f"{nome_dia} não foi salvo por completo.")
+                for _, c, msg in erros:
+                    st.write(f"• {c}: {msg}" if c else f"• {msg}")
+                if any(msg == MSG_CONFLITO for _, _, msg in erros):
+                    st.session_state[key_conflito] = True
+            elif any(not ok for _, _, ok, _ in status_uploads):
+                st.info("Os textos foram salvos; as imagens com erro mantiveram a versão anterior.")
+            else:
+                st.success(f"{nome_dia} da {label_intervalo(segunda).lower()} salvo com sucesso!")
+
+    # Depois do salvamento, para o botão aparecer já na execução que detectou o conflito
+    if st.session_state.get(key_conflito):
+        st.warning(f"Outro administrador alterou {nome_dia} enquanto você editava.")
+        if st.button(f"🔄 Recarregar {nome_dia} (descarta as alterações não salvas)", key=f"recarregar_{dia}"):
+            semana_temp.pop(dia, None)
+            semana_orig.pop(dia, None)
+            st.session_state.pop(key_conflito, None)
+            st.rerun(scope="fragment")
 
 def tela_avisos(unidade):
     st.title("🔔 Avisos do Refeitório")
@@ -498,30 +1161,173 @@ def tela_avisos(unidade):
     with st.form("form_aviso"):
         titulo = st.text_input("Título")
         mensagem = st.text_area("Mensagem", height=120)
+        valido_ate = st.date_input("Válido até (opcional)", value=None, format="DD/MM/YYYY")
         publicar = st.form_submit_button("📣 Publicar Aviso")
 
     if publicar:
-        if titulo.strip() and mensagem.strip():
-            criar_aviso(unidade, titulo.strip(), mensagem.strip())
+        if not (titulo.strip() and mensagem.strip()):
+            st.error("Título e mensagem obrigatórios.")
+        elif valido_ate and valido_ate < datetime.date.today():
+            st.error("A validade não pode estar no passado.")
+        else:
+            criar_aviso(unidade, titulo.strip(), mensagem.strip(), valido_ate)
             st.success("Aviso publicado!")
             st.rerun()
-        else:
-            st.error("Título e mensagem obrigatórios.")
 
     st.subheader("Avisos ativos")
-    avisos = listar_avisos(unidade)
+    unidade_id = get_unidade_id(unidade)
+    if not unidade_id:
+        return
+
+    if st.session_state.get("avisos_unidade") != unidade_id:
+        st.session_state.avisos_unidade = unidade_id
+        st.session_state.avisos_cursores = [None]
+    cursores = st.session_state.avisos_cursores
+
+    avisos, proximo = repo.pagina_avisos(unidade_id, apos=cursores[-1], limite=TAMANHO_PAGINA_AVISOS)
 
     if not avisos:
         st.write("Nenhum aviso ativo.")
+    for av in avisos:
+        validade = f" · até {av['valido_ate']}" if av.get("valido_ate") else ""
+        with st.expander(f"{av['titulo']} — {av['criado_em']}{validade}"):
+            st.write(av["mensagem"])
+            if st.session_state.perfil in ["admin", "admin_unidade"]:
+                if st.button(f"Desativar aviso {av['id']}", key=f"del_{av['id']}"):
+                    desativar_aviso(unidade, av["id"])
+                    st.success("Aviso desativado!")
+                    st.rerun()
+
+    col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+    if len(cursores) > 1 and col_ant.button("← Anterior", key="avisos_anterior"):
+        cursores.pop()
+        st.rerun()
+    col_pag.caption(f"Página {len(cursores)}")
+    if proximo and col_prox.button("Próxima →", key="avisos_proxima"):
+        cursores.append(proximo)
+        st.rerun()
+
+MODELO_IMPORTACAO = (
+    "unidade;data;dia;categoria;guarnicao;proteina;salada;sobremesa;imagem\n"
+    "Matriz;2026-10-19;segunda;Almoço;Arroz e feijão;Frango grelhado;Alface;Pudim;\n"
+)
+
+def tela_importar():
+    if st.session_state.perfil not in ["admin", "admin_unidade"]:
+        st.error("Acesso negado.")
+        return
+
+    st.title("📥 Importar Cardápios")
+    st.write(
+        "Envie uma planilha (.csv ou .xlsx) com uma linha por dia/categoria. "
+        "Cada linha substitui a célula correspondente, inclusive a imagem."
+    )
+    st.download_button("Baixar modelo (CSV)", MODELO_IMPORTACAO.encode("utf-8"),
+                       file_name="modelo_cardapios.csv", mime="text/csv")
+
+    # admin_unidade só importa para a própria unidade: as outras viram erro de linha
+    if st.session_state.perfil == "admin":
+        unidades = {u["nome"]: u["id"] for u in listar_unidades()}
     else:
-        for av in avisos:
-            with st.expander(f"{av['titulo']} — {av['criado_em']}"):
-                st.write(av["mensagem"])
-                if st.session_state.perfil in ["admin", "admin_unidade"]:
-                    if st.button(f"Desativar aviso {av['id']}", key=f"del_{av['id']}"):
-                        desativar_aviso(av["id"])
-                        st.success("Aviso desativado!")
-                        st.rerun()
+        nome = st.session_state.unidade_user
+        unidade_id = get_unidade_id(nome)
+        unidades = {nome: unidade_id} if unidade_id else {}
+
+    arquivo = st.file_uploader("Planilha", type=["csv", "xlsx"])
+    if not arquivo or not st.button("Importar"):
+        return
+
+    arquivo.seek(0)
+    andamento = st.empty()
+
+    def progresso(resultado):
+        andamento.text(
+            f"{resultado.lidas} linhas lidas · {resultado.gravadas} gravadas · {len(resultado.erros)} com erro"
+        )
+
+    try:
+        resultado = importar_cardapios(
+            repo, ler_planilha(arquivo, arquivo.name), unidades, DIAS, CATEGORIAS, CAMPOS_CARDAPIO,
+            tamanho_lote=IMPORTACAO_LOTE, progresso=progresso
+        )
+    except ErroImportacao as e:
+        st.error(str(e))
+        return
+    progresso(resultado)
+
+    cache = _cache_cardapios()
+    for unidade_nome, semana in resultado.semanas:
+        cache.invalidar((unidade_nome, semana))
+        agendar_snapshot(unidade_nome, datetime.date.fromisoformat(semana))
+
+    if resultado.gravadas:
+        st.success(f"{resultado.gravadas} células gravadas em {len(resultado.semanas)} semanas.")
+    if resultado.erros:
+        st.error(f"{len(resultado.erros)} linhas não foram importadas.")
+        st.dataframe([{"linha": n, "erro": msg} for n, msg in resultado.erros[:500]], use_container_width=True)
+        relatorio = "linha;erro\n" + "".join(f"{n};{msg}\n" for n, msg in resultado.erros)
+        st.download_button("Baixar lista de erros", relatorio.encode("utf-8"),
+                           file_name="erros_importacao.csv", mime="text/csv")
+
+def tela_buscar_pratos():
+    if st.session_state.perfil not in ["admin", "admin_unidade"]:
+        st.error("Acesso negado.")
+        return
+
+    st.title("🔎 Buscar Pratos")
+    st.caption("Procura em guarnição, prato principal, salada e sobremesa de todas as semanas, sem diferenciar acentos.")
+
+    unidades = listar_unidades()
+    col_busca, col_unidade = st.columns([3, 2])
+    termo = col_busca.text_input("Prato ou ingrediente", placeholder="ex.: feijoada").strip()
+    if st.session_state.perfil == "admin":
+        filtro_unidade = col_unidade.selectbox("Unidade", ["Todas"] + [u["nome"] for u in unidades], key="busca_unidade")
+        filtro_unidade = None if filtro_unidade == "Todas" else filtro_unidade
+    else:
+        filtro_unidade = st.session_state.unidade_user
+        col_unidade.write(f"Unidade: **{filtro_unidade}**")
+
+    unidade_id = get_unidade_id(filtro_unidade) if filtro_unidade else None
+    if filtro_unidade and not unidade_id:
+        st.error("Unidade não encontrada.")
+        return
+    if not termo:
+        return
+
+    # Pilha de cursores, como em tela_usuarios; volta ao início se a busca mudar
+    filtros = (termo, unidade_id)
+    if st.session_state.get("busca_filtros") != filtros:
+        st.session_state.busca_filtros = filtros
+        st.session_state.busca_cursores = [None]
+    cursores = st.session_state.busca_cursores
+
+    linhas, proximo = repo.buscar_pratos(termo, unidade_id=unidade_id, apos=cursores[-1], limite=TAMANHO_PAGINA_BUSCA)
+
+    if not linhas:
+        st.info("Nenhum prato encontrado.")
+    else:
+        nomes_unidades = {u["id"]: u["nome"] for u in unidades}
+        st.dataframe([
+            dict(
+                {
+                    "Semana": datetime.date.fromisoformat(str(l["semana_inicio"])[:10]).strftime("%d/%m/%Y"),
+                    "Dia": NOMES_DIAS.get(l["dia_semana"], l["dia_semana"]),
+                    "Unidade": nomes_unidades.get(l["unidade_id"], l["unidade_id"]),
+                    "Categoria": l["categoria"],
+                },
+                **{rotulo: l.get(campo) or "" for campo, rotulo in CAMPOS_EXIBIDOS}
+            )
+            for l in linhas
+        ], use_container_width=True, hide_index=True)
+
+    col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+    if len(cursores) > 1 and col_ant.button("← Anterior", key="busca_anterior"):
+        cursores.pop()
+        st.rerun()
+    col_pag.caption(f"Página {len(cursores)}")
+    if proximo and col_prox.button("Próxima →", key="busca_proxima"):
+        cursores.append(proximo)
+        st.rerun()
 
 def tela_usuarios():
     if st.session_state.perfil not in ["admin", "admin_unidade"]:
@@ -531,15 +1337,16 @@ def tela_usuarios():
     st.title("👥 Gerenciamento de Usuários")
     st.subheader("Cadastrar novo usuário")
 
+    eh_admin = st.session_state.perfil == "admin"
+    unidades_nomes = [u["nome"] for u in listar_unidades()] if eh_admin else []
+
     with st.form("form_user"):
         novo_usuario = st.text_input("Usuário (nome de exibição)")
         novo_email = st.text_input("Email do usuário (opcional)")
         nova_senha = st.text_input("Senha (temporária)", type="password")
 
-        if st.session_state.perfil == "admin":
+        if eh_admin:
             role = st.selectbox("Perfil", ["user", "admin", "admin_unidade"])
-            unidades = listar_unidades()
-            unidades_nomes = [u["nome"] for u in unidades]
             unidade_user = st.selectbox("Unidade do usuário", unidades_nomes)
         else:
             role = st.selectbox("Perfil", ["user", "admin_unidade"])
@@ -554,24 +1361,12 @@ def tela_usuarios():
         else:
             email = novo_email.strip() if novo_email.strip() else novo_usuario.strip().replace(" ", "_") + "@local.invalid"
 
-            plano = get_unidade_plano(unidade_user)
-            total_users = count_users_in_unidade(unidade_user)
-            total_admins = count_admin_unidade_in_unidade(unidade_user)
-
-            if plano == "free":
-                if total_users >= 3:
-                    st.error("Limite do plano Free alcançado (máx 3 usuários).")
-                elif role == "admin_unidade" and total_admins >= 1:
-                    st.error("Plano Free permite apenas 1 admin unidade.")
-                else:
-                    ok, msg = create_user_via_service_role(email, nova_senha, novo_usuario.strip(), role, unidade_user)
-                    if ok:
-                        st.success("Usuário criado!")
-                        st.rerun()
-                    else:
-                        st.error(msg)
+            # Conferência antecipada para a mensagem; o banco reconfere no insert
+            motivo = motivo_cota_excedida(consultar_cota(unidade_user), role)
 
-            else:  # plano premium = sem limites
+            if motivo:
+                st.error(motivo)
+            else:
                 ok, msg = create_user_via_service_role(email, nova_senha, novo_usuario.strip(), role, unidade_user)
                 if ok:
                     st.success("Usuário criado!")
@@ -581,14 +1376,33 @@ def tela_usuarios():
 
     st.subheader("Usuários Cadastrados")
 
-    if st.session_state.perfil == "admin":
-        lista = supabase.table("profiles").select("*").execute().data or []
+    col_busca, col_unidade, col_role = st.columns([3, 2, 2])
+    busca = col_busca.text_input("Buscar por nome ou email").strip()
+    if eh_admin:
+        filtro_unidade = col_unidade.selectbox("Unidade", ["Todas"] + unidades_nomes)
+        filtro_unidade = None if filtro_unidade == "Todas" else filtro_unidade
     else:
-        lista = supabase.table("profiles").select("*").eq("unidade", st.session_state.unidade_user).execute().data or []
+        filtro_unidade = st.session_state.unidade_user
+    filtro_role = col_role.selectbox("Perfil", ["Todos", "user", "admin_unidade", "admin"], key="filtro_role_usuarios")
+    filtro_role = None if filtro_role == "Todos" else filtro_role
+
+    # Pilha de cursores (email da última linha de cada página); volta ao início se os filtros mudarem
+    filtros = (busca, filtro_unidade, filtro_role)
+    if st.session_state.get("usuarios_filtros") != filtros:
+        st.session_state.usuarios_filtros = filtros
+        st.session_state.usuarios_cursores = [None]
+    cursores = st.session_state.usuarios_cursores
+
+    lista, proximo = repo.pagina_profiles(
+        unidade=filtro_unidade,
+        role=filtro_role,
+        busca=busca or None,
+        apos=cursores[-1],
+        limite=TAMANHO_PAGINA_USUARIOS
+    )
 
     if not lista:
-        st.info("Nenhum usuário cadastrado.")
-        return
+        st.info("Nenhum usuário encontrado." if busca or len(cursores) > 1 else "Nenhum usuário cadastrado.")
 
     for u in lista:
         col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
@@ -603,19 +1417,25 @@ def tela_usuarios():
 
         if pode_excluir:
             if col4.button("Excluir", key=f"del_{u['id']}"):
-                import requests
-                url = SUPABASE_URL.rstrip("/") + f"/auth/v1/admin/users/{u['id']}"
-                headers = {"apikey": SERVICE_ROLE_KEY, "Authorization": f"Bearer {SERVICE_ROLE_KEY}"}
-                r = requests.delete(url, headers=headers)
-                if r.status_code in (200, 204):
-                    supabase.table("profiles").delete().eq("id", u["id"]).execute()
+                ok, msg = repo.excluir_usuario_auth(u["id"])
+                if ok:
+                    repo.excluir_profile(u["id"])
                     st.success("Usuário removido!")
                     st.rerun()
                 else:
-                    st.error(f"Erro ao excluir: {r.text}")
+                    st.error(f"Erro ao excluir: {msg}")
         else:
             col4.write("—")
 
+    col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+    if len(cursores) > 1 and col_ant.button("← Anterior"):
+        cursores.pop()
+        st.rerun()
+    col_pag.caption(f"Página {len(cursores)}")
+    if proximo and col_prox.button("Próxima →"):
+        cursores.append(proximo)
+        st.rerun()
+
 
 # -------------------- TELA MEU PLANO --------------------
 def tela_meu_plano(unidade):
@@ -625,12 +1445,11 @@ def tela_meu_plano(unidade):
         st.info("Selecione uma unidade.")
         return
 
-    resp = supabase.table("unidades").select("nome, plano").eq("nome", unidade).limit(1).execute()
-    if not resp.data:
+    unidade_info = repo.buscar_unidade(unidade)
+    if not unidade_info:
         st.error("Unidade não encontrada.")
         return
 
-    unidade_info = resp.data[0]
     plano = unidade_info["plano"]
 
     st.subheader(f"🏢 Unidade: **{unidade_info['nome']}**")
@@ -644,13 +1463,15 @@ def tela_meu_plano(unidade):
     # PLANO FREE
     # ------------------------
     if plano == "free":
-        st.info("""
+        # Limites lidos do banco (limites_plano), os mesmos que o cadastro confere
+        cota = consultar_cota(unidade_info["nome"])
+        st.info(f"""
 ### 🆓 Plano FREE
-- Até **3 usuários**
+- Até **{cota["max_usuarios"]} usuários**
 - Cadastro de cardápio
 - Avisos
 - Upload de imagens
-- 1 admin unidade
+- {cota["max_admins_unidade"]} admin unidade
         """)
 
         st.markdown("### 🚀 Benefícios do Premium")
@@ -684,8 +1505,61 @@ Assim que o pagamento for identificado, o plano será atualizado.
             st.caption("🔒 Apenas administradores podem acessar opções de assinatura.")
 
 
+# -------------------- SITUAÇÃO DO BANCO --------------------
+@st.cache_resource
+def _estado_banco():
+    return {"degradado": False}
+
+def aviso_situacao_banco():
+    """Avisa quando os dados exibidos podem ser a cópia local (banco fora do ar).
+
+    Quando o banco volta, descarta o que os caches do processo guardaram
+    durante o incidente, para ninguém seguir vendo a cópia antiga.
+    """
+    situacao = repo.situacao()
+    estado = _estado_banco()
+    if situacao:
+        estado["degradado"] = True
+        st.warning(f"⚠️ {situacao}")
+    elif estado["degradado"]:
+        estado["degradado"] = False
+        _cache_unidades().invalidar()
+        _cache_cardapios().invalidar()
+        _feed_avisos().recarregar()
+
+# -------------------- DEPURAÇÃO --------------------
+def painel_metricas(rerun):
+    with st.expander("🔎 Métricas de acesso a dados", expanded=True):
+        chamadas = [c.como_dict() for c in rerun.chamadas]
+        total_ms = sum(c["ms"] for c in chamadas)
+        total_bytes = sum(c["bytes"] for c in chamadas)
+        st.caption(
+            f"Página **{rerun.pagina}** — {len(chamadas)} chamadas neste rerun, "
+            f"{total_ms:.1f} ms em I/O, {total_bytes / 1024:.1f} KB"
+        )
+        if chamadas:
+            st.dataframe(chamadas, use_container_width=True)
+
+        st.markdown("**Acumulado do processo**")
+        st.dataframe(metricas.registro.resumo(), use_container_width=True)
+        st.download_button(
+            "Baixar métricas (Prometheus)",
+            metricas.registro.prometheus(),
+            file_name="cardapio_metricas.prom",
+            mime="text/plain"
+        )
+
 # -------------------- MAIN --------------------
 def main():
+    rerun = metricas.iniciar_rerun("Login")
+    try:
+        _main(rerun)
+    finally:
+        metricas.encerrar_rerun(rerun)
+
+def _main(rerun):
+    aviso_situacao_banco()
+
     if "perfil" not in st.session_state:
         st.session_state.perfil = None
 
@@ -699,7 +1573,10 @@ def main():
     # Botão de sair sempre no sidebar
     st.sidebar.markdown(f"👤 **{st.session_state.usuario}**")
     if st.sidebar.button("Sair"):
-        supabase.auth.sign_out()
+        try:
+            repo.encerrar_sessao(st.session_state.get("session"))
+        except Exception:
+            pass
         st.session_state.clear()
         st.rerun()
 
@@ -708,11 +1585,14 @@ def main():
 
     # Menu lateral — Meu Plano só para admin/admin_unidade
     if role in ["admin", "admin_unidade"]:
-        paginas = ["Visualizar Cardápio", "Meu Plano", "Administrar", "Avisos", "Usuarios"]
+        paginas = ["Visualizar Cardápio", "Meu Plano", "Administrar", "Importar", "Buscar Pratos", "Avisos", "Usuarios"]
     else:
         paginas = ["Visualizar Cardápio"]
 
     escolha = st.sidebar.selectbox("Página", paginas)
+    rerun.pagina = escolha
+
+    depurar = role == "admin" and st.sidebar.checkbox("🔎 Métricas de acesso a dados", key="debug_metricas")
 
     if escolha == "Visualizar Cardápio":
         tela_usuario(unidade)
@@ -723,12 +1603,21 @@ def main():
     elif escolha == "Administrar":
         tela_admin(unidade)
 
+    elif escolha == "Importar":
+        tela_importar()
+
+    elif escolha == "Buscar Pratos":
+        tela_buscar_pratos()
+
     elif escolha == "Avisos":
         tela_avisos(unidade)
 
     elif escolha == "Usuarios":
         tela_usuarios()
 
+    if depurar:
+        painel_metricas(rerun)
+
 
 if __name__ == "__main__":
     main()
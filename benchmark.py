@@ -0,0 +1,264 @@
+# --------------------------------------------------------------
+# benchmark.py — Carga simulada nas páginas do app (Streamlit AppTest)
+# --------------------------------------------------------------
+# Roda N sessões simultâneas do app.py no mesmo processo (como um servidor
+# Streamlit com N abas abertas) contra o backend SQLite, que faz o papel de
+# Supabase local: mesmo esquema e mesma interface, sem rede. O caminho do
+# Supabase (RepositorioSupabase, PostgREST, storage, RLS e latência de rede)
+# nunca é exercitado: os números comparam versões do app entre si, não
+# estimam a latência em produção. Cada sessão faz login e visita as páginas;
+# para cada página são medidos:
+#   - latência dos reruns (p50 / p95, em ms);
+#   - chamadas ao repositório por rerun (via metricas.registro);
+#   - memória por sessão (tracemalloc, numa fase separada, aproximada).
+#
+# O resultado é acrescentado em benchmark_resultados.jsonl (uma linha por
+# execução, com o commit; local, fora do git) e comparado com a última execução de mesmos
+# parâmetros; --limite-regressao faz o script sair com erro se alguma página
+# piorar mais que o limite.
+#
+#   python benchmark.py --sessoes 20 --reruns 10
+import argparse
+import datetime
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+APP = Path(__file__).with_name("app.py")
+RESULTADOS = Path(__file__).with_name("benchmark_resultados.jsonl")
+
+ADMIN_EMAIL = "admin@bench.local"
+ADMIN_SENHA = "bench-admin"
+UNIDADE = "Unidade Benchmark"
+
+# Página do menu -> função medida (só para o relatório)
+PAGINAS = {
+    "Visualizar Cardápio": "tela_usuario",
+    "Administrar": "tela_admin",
+    "Avisos": "tela_avisos",
+    "Usuarios": "tela_usuarios",
+}
+
+
+def preparar_ambiente(pasta):
+    # Precisa valer antes do primeiro import de app/repositorio/resiliencia
+    os.environ.update({
+        "CARDAPIO_BACKEND": "sqlite",
+        "CARDAPIO_SQLITE_PATH": str(pasta / "cardapio.db"),
+        "CARDAPIO_STORAGE_DIR": str(pasta / "storage"),
+        "CARDAPIO_ADMIN_EMAIL": ADMIN_EMAIL,
+        "CARDAPIO_ADMIN_SENHA": ADMIN_SENHA,
+        "CARDAPIO_COPIA_LOCAL": "",
+    })
+
+
+def popular_banco(usuarios, avisos):
+    """Uma unidade premium com a semana atual preenchida, avisos e usuários."""
+    from repositorio import criar_repositorio
+
+    repo = criar_repositorio()
+    unidade_id = repo.garantir_unidade(UNIDADE, "premium")
+    hoje = datetime.date.today()
+    semana = (hoje - datetime.timedelta(days=hoje.weekday())).isoformat()
+    agora = datetime.datetime.utcnow().isoformat()
+    repo.upsert_cardapios([
+        {"unidade_id": unidade_id, "semana_inicio": semana, "dia_semana": dia, "categoria": categoria,
+         "guarnicao": "Arroz e feijão", "proteina": "Frango grelhado", "salada": "Alface",
+         "sobremesa": "Fruta", "imagem_url": None, "criado_em": agora}
+        for dia in ["segunda", "terca", "quarta", "quinta", "sexta"]
+        for categoria in ["Almoço", "Jantar"]
+    ])
+    for i in range(avisos):
+        repo.inserir_aviso({"unidade_id": unidade_id, "titulo": f"Aviso {i}", "mensagem": "Mensagem de teste",
+                            "ativo": True, "criado_em": agora})
+    for i in range(usuarios):
+        ok, user_id = repo.criar_usuario_auth(f"user{i}@bench.local", "senha", {"usuario_text": f"user{i}"})
+        if ok:
+            repo.inserir_profile({"id": user_id, "email": f"user{i}@bench.local", "usuario_text": f"user{i}",
+                                  "role": "user", "unidade": UNIDADE})
+
+
+def _widget(lista, rotulo):
+    return next(w for w in lista if w.label == rotulo)
+
+
+def _conferir(at, etapa):
+    if at.exception:
+        raise RuntimeError(f"{etapa}: {at.exception[0].value}")
+
+
+def nova_sessao(timeout):
+    """AppTest logado como admin, com a unidade de benchmark selecionada."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP), default_timeout=timeout)
+    at.run()
+    _conferir(at, "login (tela)")
+    _widget(at.text_input, "Usuário ou email").input(ADMIN_EMAIL)
+    _widget(at.text_input, "Senha").input(ADMIN_SENHA)
+    _widget(at.button, "Entrar").click()
+    at.run()
+    _conferir(at, "login (envio)")
+    _widget(at.sidebar.selectbox, "Selecione a unidade:").select(UNIDADE)
+    at.run()
+    _conferir(at, "seleção de unidade")
+    return at
+
+
+def medir_sessao(reruns, timeout):
+    """Latências (s) por página de uma sessão: login e `reruns` reruns em cada página."""
+    inicio = time.perf_counter()
+    at = nova_sessao(timeout)
+    latencias = {"Login": [time.perf_counter() - inicio]}
+    for pagina in PAGINAS:
+        _widget(at.sidebar.selectbox, "Página").select(pagina)
+        at.run()
+        _conferir(at, pagina)
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            at.run()
+            latencias.setdefault(pagina, []).append(time.perf_counter() - t0)
+            _conferir(at, pagina)
+    return latencias
+
+
+def _percentil(valores, p):
+    if len(valores) == 1:
+        return valores[0]
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1]
+
+
+def medir_latencias(sessoes, reruns, timeout):
+    import metricas
+
+    antes = metricas.registro.totais_reruns()
+    with ThreadPoolExecutor(max_workers=sessoes) as pool:
+        resultados = list(pool.map(lambda _: medir_sessao(reruns, timeout), range(sessoes)))
+    depois = metricas.registro.totais_reruns()
+
+    paginas = {}
+    for pagina in ["Login"] + list(PAGINAS):
+        amostras = [s for r in resultados for s in r.get(pagina, [])]
+        total = depois.get(pagina, {"n": 0, "chamadas": 0})
+        anterior = antes.get(pagina, {"n": 0, "chamadas": 0})
+        n = total["n"] - anterior["n"]
+        paginas[pagina] = {
+            "funcao": PAGINAS.get(pagina, "main"),
+            "amostras": len(amostras),
+            "p50_ms": round(_percentil(amostras, 50) * 1000, 1),
+            "p95_ms": round(_percentil(amostras, 95) * 1000, 1),
+            "chamadas_por_rerun": round((total["chamadas"] - anterior["chamadas"]) / n, 2) if n else None,
+        }
+    return paginas
+
+
+def medir_memoria(sessoes, timeout):
+    """Memória retida por sessão logada na página do cardápio (KB, aproximada)."""
+    nova_sessao(timeout)  # aquece caches do processo, que não contam por sessão
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    vivas = []
+    for _ in range(sessoes):
+        at = nova_sessao(timeout)
+        _widget(at.sidebar.selectbox, "Página").select("Visualizar Cardápio")
+        at.run()
+        vivas.append(at)
+    gc.collect()
+    total = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return round(total / sessoes / 1024, 1)
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=APP.parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _anterior(parametros):
+    if not RESULTADOS.exists():
+        return None
+    ultimo = None
+    for linha in RESULTADOS.read_text(encoding="utf-8").splitlines():
+        registro = json.loads(linha)
+        if registro.get("parametros") == parametros:
+            ultimo = registro
+    return ultimo
+
+
+def comparar(atual, anterior, limite):
+    """Linhas do relatório e lista de regressões acima de `limite` (fração)."""
+    linhas, regressoes = [], []
+    for pagina, m in atual["paginas"].items():
+        texto = (f"{pagina:22} p50 {m['p50_ms']:8.1f} ms  p95 {m['p95_ms']:8.1f} ms  "
+                 f"{m['chamadas_por_rerun'] if m['chamadas_por_rerun'] is not None else '-':>6} chamadas/rerun")
+        antes = (anterior or {}).get("paginas", {}).get(pagina)
+        if antes:
+            for campo in ("p95_ms", "chamadas_por_rerun"):
+                if antes.get(campo) and m.get(campo) is not None:
+                    variacao = (m[campo] - antes[campo]) / antes[campo]
+                    texto += f"  {campo} {variacao:+.0%}"
+                    if variacao > limite:
+                        regressoes.append(f"{pagina}: {campo} {antes[campo]} -> {m[campo]}")
+        linhas.append(texto)
+    linhas.append(f"{'memória por sessão':22} {atual['memoria_sessao_kb']} KB")
+    return linhas, regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das páginas do app com sessões simultâneas.")
+    parser.add_argument("--sessoes", type=int, default=10, help="sessões simultâneas")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns medidos por página e sessão")
+    parser.add_argument("--usuarios", type=int, default=200, help="profiles no banco")
+    parser.add_argument("--avisos", type=int, default=30, help="avisos ativos na unidade")
+    parser.add_argument("--timeout", type=float, default=60, help="timeout de cada rerun (s)")
+    parser.add_argument("--limite-regressao", type=float, default=None,
+                        help="ex.: 0.2 — sai com erro se p95 ou chamadas/rerun piorarem mais de 20%%")
+    parser.add_argument("--nao-gravar", action="store_true", help="não acrescenta o resultado ao histórico")
+    args = parser.parse_args()
+
+    pasta = Path(tempfile.mkdtemp(prefix="cardapio-bench-"))
+    preparar_ambiente(pasta)
+    sys.path.insert(0, str(APP.parent))
+    popular_banco(args.usuarios, args.avisos)
+
+    parametros = {"sessoes": args.sessoes, "reruns": args.reruns, "usuarios": args.usuarios, "avisos": args.avisos}
+    atual = {
+        "ts": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "parametros": parametros,
+        "paginas": medir_latencias(args.sessoes, args.reruns, args.timeout),
+        "memoria_sessao_kb": medir_memoria(args.sessoes, args.timeout),
+        "threads": threading.active_count(),
+    }
+
+    anterior = _anterior(parametros)
+    linhas, regressoes = comparar(atual, anterior, args.limite_regressao or float("inf"))
+    if anterior:
+        print(f"Comparado com {anterior.get('commit')} ({anterior['ts']})")
+    print("\n".join(linhas))
+
+    if not args.nao_gravar:
+        with open(RESULTADOS, "a", encoding="utf-8") as f:
+            f.write(json.dumps(atual, ensure_ascii=False) + "\n")
+
+    if regressoes:
+        print("\nRegressões acima do limite:\n  " + "\n  ".join(regressoes))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
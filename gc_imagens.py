@@ -0,0 +1,145 @@
+# --------------------------------------------------------------
+# gc_imagens.py — Remove do storage as fotos que nenhum cardápio usa
+# --------------------------------------------------------------
+# Cada foto enviada no painel admin vira imagens/<xx>/<hash>_media.webp e
+# _thumb.webp; trocar a foto de uma célula só troca o imagem_url em cardapios
+# e o objeto antigo fica no bucket para sempre. Este job, rodado fora do app
+# (cron, GitHub Actions, à mão):
+#   1. lê os imagem_url de cardapios, paginando por id;
+#   2. percorre a listagem de imagens/ em streaming e separa os objetos sem
+#      referência modificados há mais tempo que a carência;
+#   3. relê as referências (uma célula pode ter voltado a usar uma foto antiga
+#      no meio tempo) e apaga o restante em lotes.
+# Só imagens/ é varrido: snapshots/ e o que mais houver no bucket nunca é apagado.
+# Sem --executar, apenas relata o que seria apagado.
+#
+# A carência cobre fotos enviadas no editor e ainda não salvas. Ela deve ser
+# maior que o cache de imagens conhecidas do app (24 h): reenviar os mesmos
+# bytes de uma foto recém-apagada dentro desse cache grava a URL sem reenviar
+# o arquivo.
+#
+# No Supabase, apagar exige SERVICE_ROLE_KEY; as variáveis são as do app.
+#
+#   python gc_imagens.py                                # relatório
+#   python gc_imagens.py --executar --carencia-horas 72
+import argparse
+import datetime
+
+from dotenv import load_dotenv
+
+from repositorio import criar_repositorio
+
+PREFIXO_IMAGENS = "imagens/"
+CARENCIA_HORAS = 72
+TAMANHO_LOTE = 100
+
+# Sufixos das variantes geradas no upload: usar uma é usar todas
+VARIANTES = ("_media.webp", "_thumb.webp")
+
+
+def _variantes(path):
+    for sufixo in VARIANTES:
+        if path.endswith(sufixo):
+            base = path[: -len(sufixo)]
+            return {base + s for s in VARIANTES}
+    return {path}
+
+
+def caminhos_referenciados(repo):
+    """(paths usados por algum cardápio, com as variantes; nº de URLs de fora do storage)."""
+    caminhos, externas = set(), set()
+    for url in repo.iterar_imagens_cardapios():
+        path = repo.caminho_objeto(url)
+        if path is None:
+            externas.add(url)
+        else:
+            caminhos |= _variantes(path)
+    return caminhos, len(externas)
+
+
+class ResultadoGC:
+    def __init__(self):
+        self.objetos = 0        # objetos sob imagens/
+        self.referenciados = 0  # paths em uso (com variantes)
+        self.externas = 0       # imagem_url que não apontam para este storage
+        self.recentes = 0       # órfãos dentro da carência, mantidos
+        self.candidatos = []    # órfãos fora da carência: {"path", "tamanho", "atualizado_em"}
+        self.apagados = 0
+
+    @property
+    def bytes_candidatos(self):
+        return sum(o["tamanho"] or 0 for o in self.candidatos)
+
+
+def coletar(repo, carencia=datetime.timedelta(hours=CARENCIA_HORAS), executar=False,
+            tamanho_lote=TAMANHO_LOTE, agora=None):
+    """Acha (e, com `executar`, apaga) os objetos órfãos de imagens/ mais velhos que `carencia`."""
+    agora = agora or datetime.datetime.now(datetime.timezone.utc)
+    limite = agora - carencia
+    resultado = ResultadoGC()
+
+    referenciados, resultado.externas = caminhos_referenciados(repo)
+    resultado.referenciados = len(referenciados)
+
+    for objeto in repo.iterar_objetos(PREFIXO_IMAGENS):
+        resultado.objetos += 1
+        if objeto["path"] in referenciados:
+            continue
+        # Sem data, não há como garantir que o objeto não acabou de ser enviado
+        if objeto["atualizado_em"] is None or objeto["atualizado_em"] > limite:
+            resultado.recentes += 1
+            continue
+        resultado.candidatos.append(objeto)
+
+    if not executar or not resultado.candidatos:
+        return resultado
+
+    # A listagem não é apagada enquanto é percorrida: a paginação do storage é
+    # por offset e pularia objetos
+    referenciados, _ = caminhos_referenciados(repo)
+    resultado.candidatos = [o for o in resultado.candidatos if o["path"] not in referenciados]
+    for i in range(0, len(resultado.candidatos), tamanho_lote):
+        lote = [o["path"] for o in resultado.candidatos[i:i + tamanho_lote]]
+        repo.remover_objetos(lote)
+        resultado.apagados += len(lote)
+    return resultado
+
+
+def _megabytes(n):
+    return f"{n / 1024 / 1024:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apaga do storage as imagens que nenhum cardápio referencia.")
+    parser.add_argument("--executar", action="store_true", help="apaga de fato (sem isso, só relata)")
+    parser.add_argument("--carencia-horas", type=float, default=CARENCIA_HORAS,
+                        help="só apaga objetos modificados há mais que isso")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="objetos por chamada de remoção")
+    parser.add_argument("--listar", action="store_true", help="lista cada objeto candidato")
+    args = parser.parse_args()
+
+    load_dotenv()
+    resultado = coletar(
+        criar_repositorio(),
+        carencia=datetime.timedelta(hours=args.carencia_horas),
+        executar=args.executar,
+        tamanho_lote=args.lote,
+    )
+
+    print(f"Objetos em {PREFIXO_IMAGENS}: {resultado.objetos}")
+    print(f"Caminhos referenciados por cardápios: {resultado.referenciados}")
+    if resultado.externas:
+        print(f"URLs de imagem fora deste storage (ignoradas): {resultado.externas}")
+    print(f"Órfãos dentro da carência (mantidos): {resultado.recentes}")
+    print(f"Órfãos a apagar: {len(resultado.candidatos)} ({_megabytes(resultado.bytes_candidatos)})")
+    if args.listar:
+        for o in resultado.candidatos:
+            print(f"  {o['atualizado_em']:%Y-%m-%d %H:%M}  {o['tamanho'] or 0:>10}  {o['path']}")
+    if args.executar:
+        print(f"Apagados: {resultado.apagados}")
+    else:
+        print("Nada foi apagado (use --executar).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# --------------------------------------------------------------
+# importacao.py — Importação em lote de cardápios (CSV / XLSX)
+# --------------------------------------------------------------
+# O arquivo é lido linha a linha (CSV em streaming; XLSX com openpyxl em modo
+# read_only), cada linha é validada contra o modelo unidade/semana/dia/
+# categoria e as válidas vão para o banco em upserts de `tamanho_lote` linhas.
+#
+# Colunas (cabeçalho sem distinção de maiúsculas/acentos):
+#   unidade, data (ou semana), dia, categoria,
+#   guarnicao, proteina (ou prato_principal), salada, sobremesa, imagem (opcional)
+#
+# `data` pode ser qualquer dia da semana (vale a segunda-feira dela); sem a
+# coluna `dia`, o dia vem da própria data. Cada linha substitui a célula
+# inteira, inclusive a imagem.
+import csv
+import datetime
+import io
+import itertools
+
+from repositorio import normalizar_texto
+
+CSV_SEPARADORES = ";,\t"
+
+_ALIASES_COLUNAS = {
+    "semana": "data",
+    "semana_inicio": "data",
+    "prato_principal": "proteina",
+    "imagem_url": "imagem",
+}
+
+
+class ErroImportacao(Exception):
+    """Arquivo ilegível como um todo (formato, cabeçalho, dependência)."""
+
+
+def _normalizar(texto):
+    return normalizar_texto(str(texto)) or ""
+
+
+def _coluna(nome):
+    chave = _normalizar(nome).replace(" ", "_").replace("-", "_")
+    return _ALIASES_COLUNAS.get(chave, chave)
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+    primeira = texto.readline()
+    # Excel em português grava com ";"; o resto do mundo, com ","
+    separador = max(CSV_SEPARADORES, key=primeira.count)
+    return csv.reader(itertools.chain([primeira], texto), delimiter=separador)
+
+
+def _linhas_xlsx(arquivo):
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise ErroImportacao("Para importar .xlsx instale o pacote openpyxl (pip install openpyxl).") from e
+    livro = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from livro.active.iter_rows(values_only=True)
+    finally:
+        livro.close()
+
+
+def ler_planilha(arquivo, nome_arquivo):
+    """Gera (numero_da_linha, {coluna: valor}) sem carregar o arquivo inteiro.
+
+    `arquivo` é um objeto binário (o UploadedFile do Streamlit serve). A
+    numeração segue a da planilha: o cabeçalho é a linha 1.
+    """
+    if nome_arquivo.lower().endswith(".xlsx"):
+        linhas = _linhas_xlsx(arquivo)
+    elif nome_arquivo.lower().endswith((".csv", ".txt")):
+        linhas = _linhas_csv(arquivo)
+    else:
+        raise ErroImportacao("Formato não suportado: envie um arquivo .csv ou .xlsx.")
+
+    cabecalho = next(linhas, None)
+    if not cabecalho:
+        raise ErroImportacao("Arquivo vazio.")
+    colunas = [_coluna(c) if c is not None else "" for c in cabecalho]
+    faltando = {"unidade", "data", "categoria"} - set(colunas)
+    if faltando:
+        raise ErroImportacao(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}.")
+
+    for numero, valores in enumerate(linhas, start=2):
+        if not any(v not in (None, "") for v in valores):
+            continue  # linha em branco
+        yield numero, dict(zip(colunas, valores))
+
+
+def _data(valor):
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    texto = str(valor or "").strip()
+    for formato in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y"):
+        try:
+            return datetime.datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: '{texto}' (use AAAA-MM-DD ou DD/MM/AAAA).")
+
+
+def _texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+
+def validar_linha(registro, unidades, dias, categorias, campos):
+    """Converte uma linha da planilha na linha de `cardapios`; levanta ValueError se inválida.
+
+    `unidades` mapeia nome -> id; `dias` segue a ordem segunda..sexta.
+    """
+    nome_unidade = _texto(registro.get("unidade"))
+    if nome_unidade not in unidades:
+        raise ValueError(f"Unidade desconhecida: '{nome_unidade}'.")
+
+    data = _data(registro.get("data"))
+    segunda = data - datetime.timedelta(days=data.weekday())
+
+    dia_bruto = _normalizar(registro.get("dia") or "").replace("-feira", "").replace(" feira", "").strip()
+    if dia_bruto:
+        if dia_bruto not in dias:
+            raise ValueError(f"Dia inválido: '{registro.get('dia')}'.")
+        dia = dia_bruto
+    elif data.weekday() < len(dias):
+        dia = dias[data.weekday()]
+    else:
+        raise ValueError(f"{data.strftime('%d/%m/%Y')} cai no fim de semana; informe a coluna dia.")
+
+    por_nome = {_normalizar(c): c for c in categorias}
+    categoria = por_nome.get(_normalizar(registro.get("categoria") or ""))
+    if categoria is None:
+        raise ValueError(f"Categoria inválida: '{registro.get('categoria')}' (use {' ou '.join(categorias)}).")
+
+    valores = {campo: _texto(registro.get(campo)) for campo in campos}
+    if not any(valores.values()):
+        raise ValueError("Nenhum prato preenchido.")
+
+    return dict(
+        {"unidade_id": unidades[nome_unidade], "semana_inicio": segunda.strftime("%Y-%m-%d"),
+         "dia_semana": dia, "categoria": categoria},
+        **valores,
+        imagem_url=_texto(registro.get("imagem")) or None
+    ), nome_unidade
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.lidas = 0
+        self.gravadas = 0
+        self.erros = []       # (numero_da_linha, mensagem)
+        self.semanas = set()  # (unidade, semana) gravadas, para invalidar caches
+
+
+def importar_cardapios(repo, registros, unidades, dias, categorias, campos,
+                       tamanho_lote=500, progresso=None):
+    """Valida e grava os registros de ler_planilha() em upserts de `tamanho_lote` linhas.
+
+    Linhas inválidas entram em `erros` e não impedem as demais; um lote que
+    falha no banco marca todas as suas linhas como erro. Se a mesma célula
+    aparece mais de uma vez no arquivo, vale a última. `progresso(resultado)`
+    é chamado após cada lote.
+    """
+    resultado = ResultadoImportacao()
+    agora = datetime.datetime.utcnow().isoformat()
+    lote = {}  # chave da célula -> (numero, linha, unidade)
+
+    def gravar():
+        if not lote:
+            return
+        try:
+            repo.upsert_cardapios([linha for _, linha, _ in lote.values()])
+        except Exception as e:
+            resultado.erros.extend((numero, f"Erro ao gravar: {e}") for numero, _, _ in lote.values())
+        else:
+            resultado.gravadas += len(lote)
+            resultado.semanas.update((unidade, linha["semana_inicio"]) for _, linha, unidade in lote.values())
+        lote.clear()
+        if progresso:
+            progresso(resultado)
+
+    for numero, registro in registros:
+        resultado.lidas += 1
+        try:
+            linha, unidade = validar_linha(registro, unidades, dias, categorias, campos)
+        except ValueError as e:
+            resultado.erros.append((numero, str(e)))
+            continue
+        linha["criado_em"] = agora
+        chave = (linha["unidade_id"], linha["semana_inicio"], linha["dia_semana"], linha["categoria"])
+        # Repetir a chave no mesmo statement é erro no Postgres ("cannot affect row a second time")
+        lote.pop(chave, None)
+        lote[chave] = (numero, linha, unidade)
+        if len(lote) >= tamanho_lote:
+            gravar()
+    gravar()
+
+    resultado.erros.sort()
+    return resultado
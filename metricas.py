@@ -0,0 +1,283 @@
+# --------------------------------------------------------------
+# metricas.py — Contagem e latência das chamadas ao repositório por rerun/página
+# --------------------------------------------------------------
+# Toda chamada a tabelas, storage e auth passa pelo RepositorioInstrumentado,
+# que registra operação, função chamadora, latência e tamanho do payload no
+# rerun corrente (contextvar). Ao final do rerun, as chamadas são agregadas
+# no registro do processo, exportável em formato Prometheus ou como log JSON.
+#
+#   CARDAPIO_METRICAS_LOG   arquivo JSON Lines, uma linha por rerun
+#   CARDAPIO_METRICAS_PROM  arquivo texto Prometheus (textfile collector)
+import contextvars
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from repositorio import Repositorio
+from resiliencia import LOCAIS
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+INTERVALO_EXPORTACAO = 15  # segundos entre regravações do arquivo Prometheus
+
+_rerun_atual = contextvars.ContextVar("rerun_atual", default=None)
+
+# Frames que só repassam a chamada; a função atribuída é a primeira fora deles
+_FRAMES_INTERMEDIARIOS = {"<lambda>", "carregar", "obter_ou_carregar", "obter_ou_carregar_varios"}
+
+
+def _funcao_chamadora():
+    frame = sys._getframe(2)
+    while frame.f_back is not None and frame.f_code.co_name in _FRAMES_INTERMEDIARIOS:
+        frame = frame.f_back
+    return frame.f_code.co_name
+
+
+def _tamanho_payload(valor):
+    if valor is None:
+        return 0
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    try:
+        return len(json.dumps(valor, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class Chamada:
+    __slots__ = ("operacao", "funcao", "duracao", "bytes", "erro")
+
+    def __init__(self, operacao, funcao, duracao, bytes_, erro):
+        self.operacao = operacao
+        self.funcao = funcao
+        self.duracao = duracao
+        self.bytes = bytes_
+        self.erro = erro
+
+    def como_dict(self):
+        return {
+            "operacao": self.operacao,
+            "funcao": self.funcao,
+            "ms": round(self.duracao * 1000, 2),
+            "bytes": self.bytes,
+            "erro": self.erro
+        }
+
+
+class Rerun:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = time.perf_counter()
+        self.duracao = None
+        self.chamadas = []
+
+
+class RegistroMetricas:
+    """Agregados do processo: contagem, histograma de latência e bytes por (página, operação)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._reruns = {}
+        self._falhas = {}  # tarefa em segundo plano -> falhas
+        self._ultimo_export = 0.0
+
+    def registrar(self, pagina, chamada):
+        with self._lock:
+            serie = self._series.setdefault((pagina, chamada.operacao, chamada.funcao), {
+                "n": 0, "erros": 0, "soma": 0.0, "bytes": 0, "buckets": [0] * len(BUCKETS_LATENCIA)
+            })
+            serie["n"] += 1
+            serie["erros"] += int(chamada.erro)
+            serie["soma"] += chamada.duracao
+            serie["bytes"] += chamada.bytes
+            for i, limite in enumerate(BUCKETS_LATENCIA):
+                if chamada.duracao <= limite:
+                    serie["buckets"][i] += 1
+
+    def registrar_rerun(self, rerun):
+        with self._lock:
+            total = self._reruns.setdefault(rerun.pagina, {"n": 0, "chamadas": 0, "soma": 0.0})
+            total["n"] += 1
+            total["chamadas"] += len(rerun.chamadas)
+            total["soma"] += rerun.duracao
+        for chamada in rerun.chamadas:
+            self.registrar(rerun.pagina, chamada)
+
+    def registrar_falha(self, tarefa):
+        """Falha de uma tarefa em segundo plano (sem sessão para mostrar o erro)."""
+        with self._lock:
+            self._falhas[tarefa] = self._falhas.get(tarefa, 0) + 1
+
+    def resumo(self):
+        with self._lock:
+            return [
+                {"pagina": p, "operacao": o, "funcao": f, "chamadas": s["n"], "erros": s["erros"],
+                 "ms_medio": round(s["soma"] / s["n"] * 1000, 2), "bytes": s["bytes"]}
+                for (p, o, f), s in sorted(self._series.items())
+            ]
+
+    def totais_reruns(self):
+        """{pagina: {"n", "chamadas", "soma"}} acumulado desde o início do processo."""
+        with self._lock:
+            return {p: dict(t) for p, t in self._reruns.items()}
+
+    def prometheus(self):
+        def rotulos(**kw):
+            return ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in kw.items())
+
+        linhas = [
+            "# HELP cardapio_db_chamadas_total Chamadas ao repositório (tabelas, storage, auth).",
+            "# TYPE cardapio_db_chamadas_total counter",
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            reruns = sorted(self._reruns.items())
+            falhas = sorted(self._falhas.items())
+
+        for (p, o, f), s in series:
+            linhas.append(f"cardapio_db_chamadas_total{{{rotulos(pagina=p, operacao=o, funcao=f)}}} {s['n']}")
+        linhas += ["# HELP cardapio_db_erros_total Chamadas ao repositório que levantaram exceção.",
+                   "# TYPE cardapio_db_erros_total counter"]
+        for (p, o, f), s in series:
+            linhas.append(f"cardapio_db_erros_total{{{rotulos(pagina=p, operacao=o, funcao=f)}}} {s['erros']}")
+        linhas += ["# HELP cardapio_db_payload_bytes_total Bytes trafegados (JSON ou binário) por operação.",
+                   "# TYPE cardapio_db_payload_bytes_total counter"]
+        for (p, o, f), s in series:
+            linhas.append(f"cardapio_db_payload_bytes_total{{{rotulos(pagina=p, operacao=o, funcao=f)}}} {s['bytes']}")
+
+        linhas += ["# HELP cardapio_db_latencia_segundos Latência das chamadas ao repositório.",
+                   "# TYPE cardapio_db_latencia_segundos histogram"]
+        for (p, o, f), s in series:
+            base = rotulos(pagina=p, operacao=o, funcao=f)
+            for limite, n in zip(BUCKETS_LATENCIA, s["buckets"]):
+                linhas.append(f'cardapio_db_latencia_segundos_bucket{{{base},le="{limite}"}} {n}')
+            linhas.append(f'cardapio_db_latencia_segundos_bucket{{{base},le="+Inf"}} {s["n"]}')
+            linhas.append(f"cardapio_db_latencia_segundos_sum{{{base}}} {s['soma']:.6f}")
+            linhas.append(f"cardapio_db_latencia_segundos_count{{{base}}} {s['n']}")
+
+        linhas += ["# HELP cardapio_reruns_total Reruns do Streamlit por página.",
+                   "# TYPE cardapio_reruns_total counter"]
+        for p, t in reruns:
+            linhas.append(f"cardapio_reruns_total{{{rotulos(pagina=p)}}} {t['n']}")
+        linhas += ["# HELP cardapio_rerun_chamadas_total Chamadas ao repositório somadas por página.",
+                   "# TYPE cardapio_rerun_chamadas_total counter"]
+        for p, t in reruns:
+            linhas.append(f"cardapio_rerun_chamadas_total{{{rotulos(pagina=p)}}} {t['chamadas']}")
+        linhas += ["# HELP cardapio_rerun_segundos_total Tempo de execução dos reruns somado por página.",
+                   "# TYPE cardapio_rerun_segundos_total counter"]
+        for p, t in reruns:
+            linhas.append(f"cardapio_rerun_segundos_total{{{rotulos(pagina=p)}}} {t['soma']:.6f}")
+        linhas += ["# HELP cardapio_tarefas_falhas_total Falhas de tarefas em segundo plano (snapshots...).",
+                   "# TYPE cardapio_tarefas_falhas_total counter"]
+        for t, n in falhas:
+            linhas.append(f"cardapio_tarefas_falhas_total{{{rotulos(tarefa=t)}}} {n}")
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self, forcar=False):
+        # Lida a cada chamada: o app só carrega o .env depois de importar este módulo
+        destino = os.getenv("CARDAPIO_METRICAS_PROM")
+        if not destino:
+            return
+        agora = time.monotonic()
+        with self._lock:
+            if not forcar and agora - self._ultimo_export < INTERVALO_EXPORTACAO:
+                return
+            self._ultimo_export = agora
+        temporario = f"{destino}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temporario, destino)
+
+
+# Único por processo (o módulo é importado uma vez, ao contrário do app.py)
+registro = RegistroMetricas()
+
+
+def iniciar_rerun(pagina="?"):
+    rerun = Rerun(pagina)
+    _rerun_atual.set(rerun)
+    return rerun
+
+
+def rerun_atual():
+    return _rerun_atual.get()
+
+
+def medir_fragmento(pagina):
+    """Decorator para funções @st.fragment: o rerun só do fragmento não passa
+    por main() e ganha aqui um Rerun próprio, contado na `pagina`. Chamado
+    dentro do rerun da página, o fragmento conta nele."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medido(*args, **kwargs):
+            if _rerun_atual.get() is not None:
+                return funcao(*args, **kwargs)
+            rerun = iniciar_rerun(pagina)
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                encerrar_rerun(rerun)
+        return medido
+    return decorador
+
+
+def encerrar_rerun(rerun):
+    rerun.duracao = time.perf_counter() - rerun.inicio
+    _rerun_atual.set(None)
+    registro.registrar_rerun(rerun)
+
+    log = os.getenv("CARDAPIO_METRICAS_LOG")
+    if log:
+        linha = {
+            "ts": datetime.datetime.utcnow().isoformat(),
+            "pagina": rerun.pagina,
+            "ms": round(rerun.duracao * 1000, 2),
+            "chamadas": [c.como_dict() for c in rerun.chamadas]
+        }
+        with open(log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+    registro.exportar()
+
+
+class RepositorioInstrumentado:
+    """Envolve um Repositorio e mede cada chamada da interface."""
+
+    def __init__(self, repo):
+        self._repo = repo
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._repo, nome)
+        # Métodos extras dos wrappers (ex.: RepositorioResiliente.situacao) e os
+        # que só montam URL/caminho (LOCAIS) não são acesso a dados
+        if (nome.startswith("_") or not callable(atributo) or not hasattr(Repositorio, nome)
+                or nome in LOCAIS):
+            return atributo
+
+        def medido(*args, **kwargs):
+            funcao = _funcao_chamadora()
+            inicio = time.perf_counter()
+            resultado = None
+            erro = False
+            try:
+                resultado = atributo(*args, **kwargs)
+                return resultado
+            except Exception:
+                erro = True
+                raise
+            finally:
+                chamada = Chamada(
+                    nome, funcao, time.perf_counter() - inicio,
+                    _tamanho_payload(resultado) + sum(_tamanho_payload(a) for a in args), erro
+                )
+                rerun = _rerun_atual.get()
+                if rerun is not None:
+                    rerun.chamadas.append(chamada)
+                else:
+                    registro.registrar("(fora de rerun)", chamada)
+
+        return medido
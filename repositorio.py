@@ -0,0 +1,1260 @@
+# --------------------------------------------------------------
+# repositorio.py — Acesso a dados do Refeitório (Supabase ou SQLite local)
+# --------------------------------------------------------------
+# O app.py fala apenas com a interface Repositorio. Há duas implementações:
+#   - RepositorioSupabase: tabelas, storage e auth no Supabase (padrão)
+#   - RepositorioSQLite: mesmo esquema em um arquivo SQLite + imagens em disco,
+#     para refeitórios de um só local e para testes/benchmarks sem rede
+#
+# Escolha com CARDAPIO_BACKEND=supabase|sqlite.
+import abc
+import datetime
+import hashlib
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import unicodedata
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+
+class ErroRepositorio(Exception):
+    pass
+
+
+class ErroConfiguracao(ErroRepositorio):
+    pass
+
+
+class ObjetoJaExiste(ErroRepositorio):
+    pass
+
+
+class CotaExcedida(ErroRepositorio):
+    pass
+
+
+class UsuarioJaExiste(ErroRepositorio):
+    pass
+
+
+COLUNAS_PROFILE_LISTA = "id, email, usuario_text, role, unidade"
+COLUNAS_AVISO_LISTA = "id, titulo, mensagem, criado_em, valido_ate"
+COLUNAS_AVISO_FEED = "id, unidade_id, titulo, mensagem, ativo, criado_em, valido_ate, atualizado_em"
+COLUNAS_CARDAPIO = (
+    "id, unidade_id, semana_inicio, dia_semana, categoria, "
+    "guarnicao, proteina, salada, sobremesa, imagem_url, criado_em, versao"
+)
+COLUNAS_PRATO_BUSCA = "id, unidade_id, semana_inicio, dia_semana, categoria, guarnicao, proteina, salada, sobremesa"
+
+# Itens por chamada de listagem do storage do Supabase (máximo aceito pela API)
+PAGINA_STORAGE = 1000
+
+SQLSTATE_COTA_EXCEDIDA = "CA001"
+
+
+def motivo_cota_excedida(cota, role):
+    """Mensagem de erro se criar um usuário `role` estouraria a cota, senão None.
+    Os limites vêm do banco (tabela limites_plano), via consultar_cota()."""
+    plano = cota["plano"].title()
+    if cota["max_usuarios"] is not None and cota["usuarios"] >= cota["max_usuarios"]:
+        return f"Limite do plano {plano} alcançado (máx {cota['max_usuarios']} usuários)."
+    if (role == "admin_unidade" and cota["max_admins_unidade"] is not None
+            and cota["admins_unidade"] >= cota["max_admins_unidade"]):
+        return f"Plano {plano} permite apenas {cota['max_admins_unidade']} admin unidade."
+    return None
+
+
+def sem_acentos(texto):
+    """`texto` sem as marcas combinantes (NFD): "Feijão" -> "Feijao"."""
+    texto = unicodedata.normalize("NFD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def normalizar_texto(texto):
+    """Sem acentos, em minúsculas e com espaços simples (None se vazio).
+
+    Tira só as marcas combinantes (NFD), como o tokenizer do FTS5 do backend
+    SQLite; o unaccent do Postgres também translitera ø, ß, æ, ł... Por isso o
+    Supabase normaliza no banco (public.normalizar_texto) e nunca compara com
+    uma chave calculada aqui."""
+    if not texto:
+        return None
+    return " ".join(sem_acentos(texto).lower().split()) or None
+
+
+def normalizar_usuario(texto):
+    """Forma usada para comparar nomes de usuário no login (backend SQLite)."""
+    return normalizar_texto(texto)
+
+
+def palavras_busca(termo):
+    """Palavras de `termo` normalizadas, como os índices de busca as separam."""
+    return re.findall(r"[^\W_]+", normalizar_texto(termo) or "")
+
+
+class Repositorio(abc.ABC):
+    """Interface de persistência usada pelo app.
+
+    Linhas são devolvidas como dicts com os mesmos nomes de colunas das tabelas
+    unidades, cardapios, avisos e profiles.
+    """
+
+    # Unidades
+    @abc.abstractmethod
+    def listar_unidades(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def buscar_unidade(self, nome):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def garantir_unidade(self, nome, plano="free"):
+        """Cria a unidade se ainda não existir (sem duplicar sob concorrência) e devolve seu id."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def atualizar_plano(self, unidade_id, plano):
+        raise NotImplementedError
+
+    # Cardápios
+    @abc.abstractmethod
+    def buscar_cardapios(self, unidade_id, semana):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def buscar_cardapios_intervalo(self, unidade_id, semana_ini, semana_fim):
+        """Linhas de todas as semanas com semana_inicio entre as duas datas (inclusive)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def upsert_cardapios(self, linhas):
+        """Grava as linhas em um único statement, chave (unidade_id, semana_inicio, dia_semana, categoria)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def salvar_cardapios_versionados(self, linhas):
+        """Grava as linhas com controle de concorrência otimista, em uma transação.
+
+        Cada linha traz "versao_esperada": a versão lida pelo editor, ou None
+        para uma célula que ainda não existia. A linha só é gravada se a versão
+        no banco ainda for essa. Devolve {(semana_inicio, dia_semana, categoria):
+        nova versão}, com None nas linhas em conflito (não gravadas).
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def replicar_semana(self, unidade_id, semana, destinos, sobrescrever=False):
+        """Copia as células da semana de origem (com as imagens) para cada destino
+        {"unidade_id", "semana_inicio"} em um único statement no banco.
+
+        Células que já existem no destino são mantidas, ou substituídas com
+        `sobrescrever`. O próprio par de origem é ignorado. Devolve quantas
+        linhas foram gravadas.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iterar_imagens_cardapios(self, tamanho_pagina=1000):
+        """Gera os imagem_url preenchidos em cardapios (com repetições), paginando por id."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def buscar_pratos(self, termo, unidade_id=None, apos=None, limite=20):
+        """Células de todas as semanas (de uma unidade, ou de todas) cuja guarnição,
+        prato principal, salada ou sobremesa contêm cada palavra de `termo` como
+        início de palavra, sem diferenciar acentos e maiúsculas; mais recentes
+        primeiro, com COLUNAS_PRATO_BUSCA. Devolve (linhas, cursor), com cursor a
+        passar em `apos` para a próxima página, ou None."""
+        raise NotImplementedError
+
+    # Avisos
+    @abc.abstractmethod
+    def inserir_aviso(self, aviso):
+        """Insere e devolve a linha gravada (com id e atualizado_em)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pagina_avisos(self, unidade_id, apos=None, limite=20):
+        """Avisos ativos e dentro da validade, do mais novo para o mais antigo
+        (criado_em desc, id desc), só com as colunas exibidas. Devolve (linhas,
+        cursor), com cursor = {"criado_em", "id"} da última linha a passar em
+        `apos` para a próxima página, ou None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def arquivar_avisos_expirados(self):
+        """Desativa os avisos com valido_ate no passado; devolve quantos."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def avisos_alterados_desde(self, instante):
+        """Avisos de todas as unidades criados/alterados a partir de `instante`
+        (ISO 8601, UTC), ativos ou não, em ordem de atualizado_em."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def desativar_aviso(self, aviso_id):
+        raise NotImplementedError
+
+    # Profiles
+    @abc.abstractmethod
+    def buscar_profile(self, user_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def buscar_profile_login(self, identificador):
+        """Profile (COLUNAS_PROFILE_LISTA) de quem entra com `identificador`: o
+        email exato ou o nome de usuário, comparado pela forma normalizada do
+        próprio backend (sem acentos, maiúsculas e espaços repetidos)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pagina_profiles(self, unidade=None, role=None, busca=None, apos=None, limite=50):
+        """Uma página de profiles ordenada por email (paginação por chave).
+
+        `busca` filtra por trecho do usuario_text ou do email, sem diferenciar
+        maiúsculas. Devolve (linhas, cursor), com cursor = email a passar em
+        `apos` para obter a próxima página, ou None se esta for a última.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def consultar_cota(self, unidade_nome):
+        """Plano, contagens e limites do plano da unidade em uma ida ao banco:
+        {"plano", "usuarios", "admins_unidade", "max_usuarios",
+        "max_admins_unidade"}; limite None = sem limite."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def inserir_profile(self, profile):
+        """Insere o profile; levanta CotaExcedida se a unidade Free já estiver no
+        limite e UsuarioJaExiste se o nome de usuário já estiver em uso."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def excluir_profile(self, user_id):
+        raise NotImplementedError
+
+    # Storage
+    @abc.abstractmethod
+    def listar_objetos(self, pasta, busca=None):
+        """Nomes (sem a pasta) dos objetos em `pasta`, opcionalmente filtrados por `busca`."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def enviar_objeto(self, path, dados, content_type, sobrescrever=False):
+        """Grava o objeto; sem `sobrescrever`, levanta ObjetoJaExiste se o path já existir."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def url_publica(self, path):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def caminho_objeto(self, url):
+        """Inverso de url_publica: o path do objeto, ou None se a URL não for deste storage."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iterar_objetos(self, prefixo):
+        """Gera {"path", "tamanho", "atualizado_em"} de cada objeto sob `prefixo`, em
+        qualquer profundidade, sem montar a listagem inteira; atualizado_em é um
+        datetime em UTC (None se o storage não informar)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remover_objetos(self, paths):
+        """Apaga os objetos em uma chamada; paths que não existem são ignorados."""
+        raise NotImplementedError
+
+    # Auth
+    @abc.abstractmethod
+    def autenticar(self, email, senha):
+        """Devolve (user, session); levanta exceção se as credenciais forem inválidas."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def encerrar_sessao(self, session):
+        """Revoga a sessão devolvida por autenticar()."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def criar_usuario_auth(self, email, senha, metadados):
+        """Devolve (True, user_id) ou (False, mensagem de erro)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def excluir_usuario_auth(self, user_id):
+        """Devolve (True, "") ou (False, mensagem de erro)."""
+        raise NotImplementedError
+
+
+def _escapar_like(texto):
+    # %, _ e \ viram literais: a busca é sempre por trecho exato
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _padrao_ilike_postgrest(texto):
+    # Dentro de or=(...), o valor vai entre aspas para aceitar vírgulas e parênteses;
+    # * é o curinga do PostgREST e não pode vir do usuário
+    padrao = "*" + _escapar_like(texto.replace("*", "")) + "*"
+    return '"' + padrao.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _instante_utc(texto):
+    # O storage devolve "2026-10-17T12:00:00.123Z"; fromisoformat antigo não aceita o Z
+    if not texto:
+        return None
+    return datetime.datetime.fromisoformat(texto.replace("Z", "+00:00"))
+
+
+def _fatiar_pagina(linhas, limite, chave="email"):
+    # Busca-se limite + 1 linhas: a sobra indica que existe próxima página.
+    # Com várias colunas de ordem (tupla), o cursor é um dict com todas elas.
+    if len(linhas) > limite:
+        ultima = linhas[limite - 1]
+        cursor = {c: ultima[c] for c in chave} if isinstance(chave, tuple) else ultima[chave]
+        return linhas[:limite], cursor
+    return linhas, None
+
+
+def _pagina_pratos(linhas, limite):
+    # Ordem (semana_inicio desc, id desc): o cursor precisa das duas colunas
+    colunas = COLUNAS_PRATO_BUSCA.split(", ")
+    linhas = [{c: linha[c] for c in colunas} for linha in linhas]
+    if len(linhas) > limite:
+        ultima = linhas[limite - 1]
+        return linhas[:limite], {"semana_inicio": ultima["semana_inicio"], "id": ultima["id"]}
+    return linhas, None
+
+
+# -------------------- SUPABASE --------------------
+class RepositorioSupabase(Repositorio):
+    """Uma instância por processo, compartilhada por todas as sessões.
+
+    O client do supabase-py fica sempre com a chave anon: o login de cada
+    usuário é feito direto no endpoint de auth e a sessão devolvida fica com
+    quem chamou (st.session_state), nunca no client compartilhado.
+    """
+
+    def __init__(self, url, key, service_role_key=None, bucket="cardapio", timeout=10.0):
+        import httpx
+        from supabase import create_client
+        from supabase.lib.client_options import ClientOptions
+
+        self.url = url
+        self.key = key
+        self.service_role_key = service_role_key
+        self.bucket = bucket
+        # Sem timeout explícito uma consulta presa segura o rerun indefinidamente
+        self.client = create_client(url, key, options=ClientOptions(
+            postgrest_client_timeout=timeout, storage_client_timeout=timeout
+        ))
+        # Conexões keep-alive reaproveitadas pelas chamadas de auth (login, admin)
+        self.http = httpx.Client(
+            base_url=url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+        )
+
+    # Unidades
+    def listar_unidades(self):
+        resp = self.client.table("unidades").select("id, nome, plano").order("nome").execute()
+        return resp.data or []
+
+    def buscar_unidade(self, nome):
+        resp = self.client.table("unidades").select("id, nome, plano").eq("nome", nome).limit(1).execute()
+        return resp.data[0] if resp.data else None
+
+    def garantir_unidade(self, nome, plano="free"):
+        unidade = self.buscar_unidade(nome)
+        if unidade:
+            return unidade["id"]
+        # on_conflict em "nome" (índice único) evita duplicatas entre sessões concorrentes
+        self.client.table("unidades").upsert(
+            {"nome": nome, "plano": plano}, on_conflict="nome", ignore_duplicates=True
+        ).execute()
+        # Relê após o upsert: se outra sessão inseriu primeiro, o upsert não devolve a linha
+        unidade = self.buscar_unidade(nome)
+        return unidade["id"] if unidade else None
+
+    def atualizar_plano(self, unidade_id, plano):
+        self.client.table("unidades").update({"plano": plano}).eq("id", unidade_id).execute()
+
+    # Cardápios
+    def buscar_cardapios(self, unidade_id, semana):
+        resp = self.client.table("cardapios").select(COLUNAS_CARDAPIO).match({
+            "unidade_id": unidade_id,
+            "semana_inicio": semana
+        }).execute()
+        return resp.data or []
+
+    def buscar_cardapios_intervalo(self, unidade_id, semana_ini, semana_fim):
+        resp = (
+            self.client.table("cardapios")
+            .select(COLUNAS_CARDAPIO)
+            .eq("unidade_id", unidade_id)
+            .gte("semana_inicio", semana_ini)
+            .lte("semana_inicio", semana_fim)
+            .execute()
+        )
+        return resp.data or []
+
+    def upsert_cardapios(self, linhas):
+        self.client.table("cardapios").upsert(
+            linhas, on_conflict="unidade_id,semana_inicio,dia_semana,categoria"
+        ).execute()
+
+    def salvar_cardapios_versionados(self, linhas):
+        resp = self.client.rpc("salvar_cardapios_versionados", {"p_linhas": linhas}).execute()
+        return {
+            (str(r["semana_inicio"])[:10], r["dia_semana"], r["categoria"]): r["versao"]
+            for r in resp.data or []
+        }
+
+    def replicar_semana(self, unidade_id, semana, destinos, sobrescrever=False):
+        resp = self.client.rpc("replicar_semana", {
+            "p_origem": {"unidade_id": unidade_id, "semana_inicio": semana},
+            "p_destinos": destinos,
+            "p_sobrescrever": sobrescrever
+        }).execute()
+        return resp.data or 0
+
+    def iterar_imagens_cardapios(self, tamanho_pagina=1000):
+        ultimo = 0
+        while True:
+            resp = (
+                self.client.table("cardapios")
+                .select("id, imagem_url")
+                .not_.is_("imagem_url", "null")
+                .gt("id", ultimo)
+                .order("id")
+                .limit(tamanho_pagina)
+                .execute()
+            )
+            linhas = resp.data or []
+            for linha in linhas:
+                yield linha["imagem_url"]
+            if len(linhas) < tamanho_pagina:
+                return
+            ultimo = linhas[-1]["id"]
+
+    def buscar_pratos(self, termo, unidade_id=None, apos=None, limite=20):
+        if not palavras_busca(termo):
+            return [], None
+        resp = self.client.rpc("buscar_pratos", {
+            "p_termo": termo,
+            "p_unidade_id": unidade_id,
+            "p_apos": apos,
+            "p_limite": limite + 1
+        }).execute()
+        return _pagina_pratos(resp.data or [], limite)
+
+    # Avisos
+    def inserir_aviso(self, aviso):
+        resp = self.client.table("avisos").insert(aviso).execute()
+        return resp.data[0] if resp.data else None
+
+    def pagina_avisos(self, unidade_id, apos=None, limite=20):
+        hoje = datetime.date.today().isoformat()
+        query = (
+            self.client.table("avisos")
+            .select(COLUNAS_AVISO_LISTA)
+            .eq("unidade_id", unidade_id)
+            .eq("ativo", True)
+            .or_(f"valido_ate.is.null,valido_ate.gte.{hoje}")
+            .order("criado_em", desc=True)
+            .order("id", desc=True)
+            .limit(limite + 1)
+        )
+        if apos is not None:
+            # (criado_em, id) < cursor: avisos com o mesmo criado_em na virada
+            # da página não são pulados. Aspas: o timestamp tem ":" e "."
+            criado_em = apos["criado_em"]
+            query = query.or_(
+                f'criado_em.lt."{criado_em}",and(criado_em.eq."{criado_em}",id.lt.{int(apos["id"])})'
+            )
+        return _fatiar_pagina(query.execute().data or [], limite, ("criado_em", "id"))
+
+    def arquivar_avisos_expirados(self):
+        resp = self.client.rpc("arquivar_avisos_expirados", {}).execute()
+        return resp.data or 0
+
+    def avisos_alterados_desde(self, instante):
+        resp = (
+            self.client.table("avisos")
+            .select(COLUNAS_AVISO_FEED)
+            .gte("atualizado_em", instante)
+            .order("atualizado_em")
+            .execute()
+        )
+        return resp.data or []
+
+    def desativar_aviso(self, aviso_id):
+        # atualizado_em é renovado pelo trigger avisos_atualizado_em
+        self.client.table("avisos").update({"ativo": False}).eq("id", aviso_id).execute()
+
+    # Profiles
+    def buscar_profile(self, user_id):
+        resp = self.client.table("profiles").select("*").eq("id", str(user_id)).execute()
+        return resp.data[0] if resp.data else None
+
+    def buscar_profile_login(self, identificador):
+        if "@" in identificador:
+            resp = (
+                self.client.table("profiles").select(COLUNAS_PROFILE_LISTA)
+                .eq("email", identificador.strip()).limit(1).execute()
+            )
+        else:
+            # Normalizado no banco, pela mesma função do trigger que mantém
+            # usuario_normalizado (índice único, igualdade sem curingas)
+            resp = self.client.rpc("buscar_profile_login", {"p_usuario": identificador}).execute()
+        return resp.data[0] if resp.data else None
+
+    def pagina_profiles(self, unidade=None, role=None, busca=None, apos=None, limite=50):
+        query = self.client.table("profiles").select(COLUNAS_PROFILE_LISTA).order("email").limit(limite + 1)
+        if unidade is not None:
+            query = query.eq("unidade", unidade)
+        if role is not None:
+            query = query.eq("role", role)
+        if apos is not None:
+            query = query.gt("email", apos)
+        if busca:
+            padrao = _padrao_ilike_postgrest(busca)
+            query = query.or_(f"usuario_text.ilike.{padrao},email.ilike.{padrao}")
+        linhas = query.execute().data or []
+        return _fatiar_pagina(linhas, limite)
+
+    def consultar_cota(self, unidade_nome):
+        # Função SQL cota_unidade: contagens feitas no banco, sem trafegar os profiles
+        resp = self.client.rpc("cota_unidade", {"p_unidade": unidade_nome}).execute()
+        linha = (resp.data or [{}])[0]
+        return {
+            "plano": linha.get("plano") or "free",
+            "usuarios": linha.get("usuarios") or 0,
+            "admins_unidade": linha.get("admins_unidade") or 0,
+            "max_usuarios": linha.get("max_usuarios"),
+            "max_admins_unidade": linha.get("max_admins_unidade")
+        }
+
+    def inserir_profile(self, profile):
+        from postgrest.exceptions import APIError
+
+        try:
+            self.client.table("profiles").insert(profile).execute()
+        except APIError as e:
+            if e.code == SQLSTATE_COTA_EXCEDIDA:
+                raise CotaExcedida(e.message) from e
+            if e.code == "23505" and "usuario_normalizado" in (e.message or ""):
+                raise UsuarioJaExiste(f"Já existe um usuário chamado '{profile.get('usuario_text')}'.") from e
+            raise
+
+    def excluir_profile(self, user_id):
+        self.client.table("profiles").delete().eq("id", user_id).execute()
+
+    # Storage
+    def listar_objetos(self, pasta, busca=None):
+        opcoes = {"search": busca} if busca else None
+        objetos = self.client.storage.from_(self.bucket).list(pasta, opcoes) or []
+        return [o.get("name") for o in objetos]
+
+    def enviar_objeto(self, path, dados, content_type, sobrescrever=False):
+        opcoes = {"content-type": content_type}
+        if sobrescrever:
+            opcoes["upsert"] = "true"
+        try:
+            self.client.storage.from_(self.bucket).upload(path=path, file=dados, file_options=opcoes)
+        except Exception as e:
+            msg = str(e).lower()
+            if "duplicate" in msg or "already exists" in msg:
+                raise ObjetoJaExiste(path) from e
+            raise
+
+    def url_publica(self, path):
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{path}"
+
+    def caminho_objeto(self, url):
+        prefixo = self.url_publica("")
+        if not url or not url.startswith(prefixo):
+            return None
+        return url[len(prefixo):].split("?", 1)[0] or None
+
+    def iterar_objetos(self, prefixo):
+        # A API lista uma pasta por vez; subpastas vêm como itens sem id
+        pastas = [prefixo.strip("/")]
+        while pastas:
+            pasta = pastas.pop()
+            offset = 0
+            while True:
+                itens = self.client.storage.from_(self.bucket).list(pasta, {
+                    "limit": PAGINA_STORAGE,
+                    "offset": offset,
+                    "sortBy": {"column": "name", "order": "asc"},
+                }) or []
+                for item in itens:
+                    path = f"{pasta}/{item['name']}" if pasta else item["name"]
+                    if item.get("id") is None:
+                        pastas.append(path)
+                        continue
+                    yield {
+                        "path": path,
+                        "tamanho": (item.get("metadata") or {}).get("size"),
+                        "atualizado_em": _instante_utc(item.get("updated_at") or item.get("created_at")),
+                    }
+                if len(itens) < PAGINA_STORAGE:
+                    break
+                offset += PAGINA_STORAGE
+
+    def remover_objetos(self, paths):
+        if not paths:
+            return
+        # A chave anon não tem (nem deve ter) permissão de apagar objetos do bucket
+        if not self.service_role_key:
+            raise ErroConfiguracao("SERVICE_ROLE_KEY não configurada.")
+        r = self.http.request(
+            "DELETE", f"/storage/v1/object/{self.bucket}",
+            headers=self._headers_admin(), json={"prefixes": list(paths)}
+        )
+        if r.status_code != 200:
+            raise ErroRepositorio(f"Erro removendo objetos: {r.status_code} {r.text}")
+
+    # Auth
+    def autenticar(self, email, senha):
+        r = self.http.post(
+            "/auth/v1/token",
+            params={"grant_type": "password"},
+            headers={"apikey": self.key},
+            json={"email": email, "password": senha}
+        )
+        if r.status_code != 200:
+            raise ErroRepositorio(f"Falha no login: {r.status_code} {r.text}")
+        dados = r.json()
+        user = SimpleNamespace(id=dados["user"]["id"], email=dados["user"].get("email"))
+        session = SimpleNamespace(
+            access_token=dados.get("access_token"),
+            refresh_token=dados.get("refresh_token"),
+            expires_at=dados.get("expires_at"),
+            user=user
+        )
+        return user, session
+
+    def encerrar_sessao(self, session):
+        token = getattr(session, "access_token", None)
+        if token:
+            self.http.post("/auth/v1/logout", headers={"apikey": self.key, "Authorization": f"Bearer {token}"})
+
+    def _headers_admin(self):
+        return {
+            "apikey": self.service_role_key,
+            "Authorization": f"Bearer {self.service_role_key}"
+        }
+
+    def criar_usuario_auth(self, email, senha, metadados):
+        if not self.service_role_key:
+            return False, "SERVICE_ROLE_KEY não configurada."
+
+        payload = {
+            "email": email,
+            "password": senha,
+            "email_confirm": True,
+            "user_metadata": metadados
+        }
+
+        r = self.http.post("/auth/v1/admin/users", headers=self._headers_admin(), json=payload)
+        if r.status_code not in (200, 201):
+            return False, f"Erro criando auth user: {r.status_code} {r.text}"
+        return True, r.json().get("id")
+
+    def excluir_usuario_auth(self, user_id):
+        if not self.service_role_key:
+            return False, "SERVICE_ROLE_KEY não configurada."
+
+        r = self.http.delete(f"/auth/v1/admin/users/{user_id}", headers=self._headers_admin())
+        if r.status_code in (200, 204):
+            return True, ""
+        return False, r.text
+
+
+# -------------------- SQLITE --------------------
+ESQUEMA_SQLITE = """
+create table if not exists unidades (
+    id integer primary key autoincrement,
+    nome text not null unique,
+    plano text not null default 'free'
+);
+
+create table if not exists cardapios (
+    id integer primary key autoincrement,
+    unidade_id integer not null references unidades (id),
+    semana_inicio text not null,
+    dia_semana text not null,
+    categoria text not null,
+    guarnicao text,
+    proteina text,
+    salada text,
+    sobremesa text,
+    imagem_url text,
+    criado_em text,
+    versao integer not null default 1,
+    unique (unidade_id, semana_inicio, dia_semana, categoria)
+);
+
+create table if not exists avisos (
+    id integer primary key autoincrement,
+    unidade_id integer not null references unidades (id),
+    titulo text not null,
+    mensagem text not null,
+    ativo integer not null default 1,
+    criado_em text,
+    atualizado_em text,
+    valido_ate text,
+    arquivado_em text
+);
+create index if not exists avisos_unidade_ativo_idx on avisos (unidade_id, ativo, criado_em, id);
+
+create table if not exists profiles (
+    id text primary key,
+    email text not null unique,
+    usuario_text text,
+    role text not null default 'user',
+    unidade text,
+    usuario_normalizado text
+);
+create index if not exists profiles_unidade_idx on profiles (unidade, role);
+
+-- Limites por plano (null = sem limite), como public.limites_plano no Supabase
+create table if not exists limites_plano (
+    plano text primary key,
+    max_usuarios integer,
+    max_admins_unidade integer
+);
+insert or ignore into limites_plano (plano, max_usuarios, max_admins_unidade) values ('free', 3, 1);
+
+-- Equivalente local de auth.users
+create table if not exists usuarios_auth (
+    id text primary key,
+    email text not null unique,
+    senha_hash text not null,
+    metadados text
+);
+"""
+
+# Colunas acrescentadas depois da criação do esquema: bancos locais antigos
+# recebem um "alter table" ao abrir
+COLUNAS_NOVAS_SQLITE = [
+    ("cardapios", "versao", "integer not null default 1"),
+    ("avisos", "atualizado_em", "text"),
+    ("avisos", "valido_ate", "text"),
+    ("avisos", "arquivado_em", "text"),
+    ("profiles", "usuario_normalizado", "text"),
+]
+
+# Índices que dependem de colunas acrescentadas por COLUNAS_NOVAS_SQLITE
+INDICES_SQLITE = """
+create index if not exists avisos_atualizado_em_idx on avisos (atualizado_em);
+create index if not exists avisos_validade_idx on avisos (ativo, valido_ate);
+create unique index if not exists profiles_usuario_normalizado_idx on profiles (usuario_normalizado);
+"""
+
+# Índice invertido dos pratos (FTS5, sem acentos nem maiúsculas), mantido por
+# triggers a partir de cardapios
+BUSCA_SQLITE = """
+create virtual table if not exists cardapios_busca using fts5(
+    guarnicao, proteina, salada, sobremesa,
+    content = 'cardapios', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+create trigger if not exists cardapios_busca_ai after insert on cardapios begin
+    insert into cardapios_busca (rowid, guarnicao, proteina, salada, sobremesa)
+    values (new.id, new.guarnicao, new.proteina, new.salada, new.sobremesa);
+end;
+create trigger if not exists cardapios_busca_ad after delete on cardapios begin
+    insert into cardapios_busca (cardapios_busca, rowid, guarnicao, proteina, salada, sobremesa)
+    values ('delete', old.id, old.guarnicao, old.proteina, old.salada, old.sobremesa);
+end;
+create trigger if not exists cardapios_busca_au after update of guarnicao, proteina, salada, sobremesa on cardapios begin
+    insert into cardapios_busca (cardapios_busca, rowid, guarnicao, proteina, salada, sobremesa)
+    values ('delete', old.id, old.guarnicao, old.proteina, old.salada, old.sobremesa);
+    insert into cardapios_busca (rowid, guarnicao, proteina, salada, sobremesa)
+    values (new.id, new.guarnicao, new.proteina, new.salada, new.sobremesa);
+end;
+"""
+
+
+def _agora_iso():
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _aviso_de_linha(linha):
+    linha["ativo"] = bool(linha["ativo"])
+    return linha
+
+_ITERACOES_SENHA = 200_000
+
+
+def _hash_senha(senha, salt=None):
+    salt = salt or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(salt), _ITERACOES_SENHA)
+    return f"pbkdf2_sha256${_ITERACOES_SENHA}${salt}${digest.hex()}"
+
+
+def _confere_senha(senha, senha_hash):
+    _, iteracoes, salt, esperado = senha_hash.split("$")
+    digest = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), bytes.fromhex(salt), int(iteracoes))
+    return secrets.compare_digest(digest.hex(), esperado)
+
+
+class RepositorioSQLite(Repositorio):
+    """Mesmo esquema do Supabase em um arquivo SQLite; storage é um diretório local.
+
+    Uma única conexão é compartilhada pelas threads do servidor, protegida por lock.
+    """
+
+    def __init__(self, caminho_db, dir_storage, admin_inicial=None):
+        self.dir_storage = Path(dir_storage).resolve()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(caminho_db, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("pragma journal_mode = wal")
+        self._conn.execute("pragma foreign_keys = on")
+        self._conn.executescript(ESQUEMA_SQLITE)
+        self._migrar()
+        if admin_inicial:
+            self._criar_admin_inicial(*admin_inicial)
+
+    def _consultar(self, sql, params=()):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def _executar(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _migrar(self):
+        for tabela, coluna, definicao in COLUNAS_NOVAS_SQLITE:
+            existentes = {r["name"] for r in self._consultar(f"pragma table_info({tabela})")}
+            if coluna not in existentes:
+                self._executar(f"alter table {tabela} add column {coluna} {definicao}")
+        self._preencher_usuario_normalizado()
+        with self._lock:
+            self._conn.executescript(INDICES_SQLITE)
+        self._criar_busca_pratos()
+
+    def _criar_busca_pratos(self):
+        # Bancos criados antes da busca: indexa os cardápios que já existem
+        novo = not self._consultar("select 1 from sqlite_master where name = 'cardapios_busca'")
+        with self._lock:
+            self._conn.executescript(BUSCA_SQLITE)
+            if novo:
+                with self._conn:
+                    self._conn.execute("insert into cardapios_busca (cardapios_busca) values ('rebuild')")
+
+    def _preencher_usuario_normalizado(self):
+        # Bancos criados antes da coluna: calcula e confere duplicatas antes do índice único
+        pendentes = self._consultar(
+            "select id, usuario_text from profiles where usuario_normalizado is null and usuario_text is not null"
+        )
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "update profiles set usuario_normalizado = ? where id = ?",
+                [(normalizar_usuario(p["usuario_text"]), p["id"]) for p in pendentes]
+            )
+        duplicados = self._consultar(
+            """select usuario_normalizado from profiles where usuario_normalizado is not null
+               group by usuario_normalizado having count(*) > 1"""
+        )
+        if duplicados:
+            nomes = ", ".join(d["usuario_normalizado"] for d in duplicados)
+            raise ErroConfiguracao(f"Nomes de usuário repetidos (renomeie antes de continuar): {nomes}")
+
+    def _criar_admin_inicial(self, email, senha):
+        # Sem Supabase não há painel para criar o primeiro admin
+        if self._consultar("select 1 from profiles where role = 'admin' limit 1"):
+            return
+        ok, user_id = self.criar_usuario_auth(email, senha, {"usuario_text": "admin"})
+        if ok:
+            self.inserir_profile({"id": user_id, "email": email, "usuario_text": "admin", "role": "admin", "unidade": None})
+
+    # Unidades
+    def listar_unidades(self):
+        return self._consultar("select id, nome, plano from unidades order by nome")
+
+    def buscar_unidade(self, nome):
+        linhas = self._consultar("select id, nome, plano from unidades where nome = ? limit 1", (nome,))
+        return linhas[0] if linhas else None
+
+    def garantir_unidade(self, nome, plano="free"):
+        with self._lock:
+            self._executar("insert into unidades (nome, plano) values (?, ?) on conflict (nome) do nothing", (nome, plano))
+            unidade = self.buscar_unidade(nome)
+        return unidade["id"] if unidade else None
+
+    def atualizar_plano(self, unidade_id, plano):
+        self._executar("update unidades set plano = ? where id = ?", (plano, unidade_id))
+
+    # Cardápios
+    def buscar_cardapios(self, unidade_id, semana):
+        return self._consultar(
+            "select * from cardapios where unidade_id = ? and semana_inicio = ?", (unidade_id, semana)
+        )
+
+    def buscar_cardapios_intervalo(self, unidade_id, semana_ini, semana_fim):
+        return self._consultar(
+            "select * from cardapios where unidade_id = ? and semana_inicio between ? and ?",
+            (unidade_id, semana_ini, semana_fim)
+        )
+
+    def upsert_cardapios(self, linhas):
+        sql = """
+            insert into cardapios (unidade_id, semana_inicio, dia_semana, categoria,
+                                   guarnicao, proteina, salada, sobremesa, imagem_url, criado_em)
+            values (:unidade_id, :semana_inicio, :dia_semana, :categoria,
+                    :guarnicao, :proteina, :salada, :sobremesa, :imagem_url, :criado_em)
+            on conflict (unidade_id, semana_inicio, dia_semana, categoria) do update set
+                guarnicao = excluded.guarnicao,
+                proteina = excluded.proteina,
+                salada = excluded.salada,
+                sobremesa = excluded.sobremesa,
+                imagem_url = excluded.imagem_url,
+                criado_em = excluded.criado_em,
+                versao = cardapios.versao + 1
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(sql, linhas)
+
+    def salvar_cardapios_versionados(self, linhas):
+        inserir = """
+            insert into cardapios (unidade_id, semana_inicio, dia_semana, categoria,
+                                   guarnicao, proteina, salada, sobremesa, imagem_url, criado_em)
+            values (:unidade_id, :semana_inicio, :dia_semana, :categoria,
+                    :guarnicao, :proteina, :salada, :sobremesa, :imagem_url, :criado_em)
+            on conflict (unidade_id, semana_inicio, dia_semana, categoria) do nothing
+        """
+        atualizar = """
+            update cardapios set
+                guarnicao = :guarnicao,
+                proteina = :proteina,
+                salada = :salada,
+                sobremesa = :sobremesa,
+                imagem_url = :imagem_url,
+                criado_em = :criado_em,
+                versao = versao + 1
+            where unidade_id = :unidade_id and semana_inicio = :semana_inicio
+              and dia_semana = :dia_semana and categoria = :categoria
+              and versao = :versao_esperada
+        """
+        versoes = {}
+        with self._lock, self._conn:
+            for linha in linhas:
+                chave = (linha["semana_inicio"], linha["dia_semana"], linha["categoria"])
+                esperada = linha.get("versao_esperada")
+                if esperada is None:
+                    gravou = self._conn.execute(inserir, linha).rowcount
+                    versoes[chave] = 1 if gravou else None
+                else:
+                    gravou = self._conn.execute(atualizar, linha).rowcount
+                    versoes[chave] = esperada + 1 if gravou else None
+        return versoes
+
+    def replicar_semana(self, unidade_id, semana, destinos, sobrescrever=False):
+        if sobrescrever:
+            conflito = """do update set
+                guarnicao = excluded.guarnicao,
+                proteina = excluded.proteina,
+                salada = excluded.salada,
+                sobremesa = excluded.sobremesa,
+                imagem_url = excluded.imagem_url,
+                criado_em = excluded.criado_em,
+                versao = cardapios.versao + 1"""
+        else:
+            conflito = "do nothing"
+        # "where true": sem ele o SQLite confunde o "on conflict" com um join do select
+        sql = f"""
+            insert into cardapios (unidade_id, semana_inicio, dia_semana, categoria,
+                                   guarnicao, proteina, salada, sobremesa, imagem_url, criado_em)
+            select d.unidade_id, d.semana_inicio, o.dia_semana, o.categoria,
+                   o.guarnicao, o.proteina, o.salada, o.sobremesa, o.imagem_url, :agora
+            from (
+                select distinct json_extract(value, '$.unidade_id') as unidade_id,
+                                json_extract(value, '$.semana_inicio') as semana_inicio
+                from json_each(:destinos)
+            ) d
+            join cardapios o on o.unidade_id = :unidade_id and o.semana_inicio = :semana
+            where true and not (d.unidade_id = :unidade_id and d.semana_inicio = :semana)
+            on conflict (unidade_id, semana_inicio, dia_semana, categoria) {conflito}
+        """
+        params = {"destinos": json.dumps(destinos), "unidade_id": unidade_id, "semana": semana, "agora": _agora_iso()}
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def iterar_imagens_cardapios(self, tamanho_pagina=1000):
+        ultimo = 0
+        while True:
+            linhas = self._consultar(
+                "select id, imagem_url from cardapios where imagem_url is not null and id > ? order by id limit ?",
+                (ultimo, tamanho_pagina)
+            )
+            for linha in linhas:
+                yield linha["imagem_url"]
+            if len(linhas) < tamanho_pagina:
+                return
+            ultimo = linhas[-1]["id"]
+
+    def buscar_pratos(self, termo, unidade_id=None, apos=None, limite=20):
+        palavras = palavras_busca(termo)
+        if not palavras:
+            return [], None
+        # Cada palavra como prefixo entre aspas (sem operadores vindos do usuário), todas obrigatórias
+        consulta = " ".join(f'"{p}"*' for p in palavras)
+        colunas = ", ".join(f"c.{c}" for c in COLUNAS_PRATO_BUSCA.split(", "))
+        sql = f"""
+            select {colunas} from cardapios_busca b join cardapios c on c.id = b.rowid
+            where cardapios_busca match :consulta
+              and (:unidade_id is null or c.unidade_id = :unidade_id)
+              and (:apos_semana is null or (c.semana_inicio, c.id) < (:apos_semana, :apos_id))
+            order by c.semana_inicio desc, c.id desc
+            limit :limite
+        """
+        apos = apos or {}
+        linhas = self._consultar(sql, {
+            "consulta": consulta, "unidade_id": unidade_id,
+            "apos_semana": apos.get("semana_inicio"), "apos_id": apos.get("id"),
+            "limite": limite + 1
+        })
+        return _pagina_pratos(linhas, limite)
+
+    # Avisos
+    def inserir_aviso(self, aviso):
+        with self._lock:
+            cursor = self._executar(
+                """insert into avisos (unidade_id, titulo, mensagem, ativo, criado_em, atualizado_em, valido_ate)
+                   values (?, ?, ?, ?, ?, ?, ?)""",
+                (aviso["unidade_id"], aviso["titulo"], aviso["mensagem"], int(aviso.get("ativo", True)),
+                 aviso.get("criado_em"), _agora_iso(), aviso.get("valido_ate"))
+            )
+            linhas = self._consultar("select * from avisos where id = ?", (cursor.lastrowid,))
+        return _aviso_de_linha(linhas[0])
+
+    def pagina_avisos(self, unidade_id, apos=None, limite=20):
+        sql = f"""
+            select {COLUNAS_AVISO_LISTA} from avisos
+            where unidade_id = ? and ativo = 1 and (valido_ate is null or valido_ate >= ?)
+        """
+        params = [unidade_id, datetime.date.today().isoformat()]
+        if apos is not None:
+            sql += " and (criado_em, id) < (?, ?)"
+            params += [apos["criado_em"], apos["id"]]
+        sql += " order by criado_em desc, id desc limit ?"
+        params.append(limite + 1)
+        return _fatiar_pagina(self._consultar(sql, params), limite, ("criado_em", "id"))
+
+    def arquivar_avisos_expirados(self):
+        agora = _agora_iso()
+        cursor = self._executar(
+            """update avisos set ativo = 0, arquivado_em = ?, atualizado_em = ?
+               where ativo = 1 and valido_ate < ?""",
+            (agora, agora, datetime.date.today().isoformat())
+        )
+        return cursor.rowcount
+
+    def avisos_alterados_desde(self, instante):
+        linhas = self._consultar(
+            f"select {COLUNAS_AVISO_FEED} from avisos where atualizado_em >= ? order by atualizado_em", (instante,)
+        )
+        return [_aviso_de_linha(l) for l in linhas]
+
+    def desativar_aviso(self, aviso_id):
+        self._executar("update avisos set ativo = 0, atualizado_em = ? where id = ?", (_agora_iso(), aviso_id))
+
+    # Profiles
+    def buscar_profile(self, user_id):
+        linhas = self._consultar("select * from profiles where id = ?", (str(user_id),))
+        return linhas[0] if linhas else None
+
+    def buscar_profile_login(self, identificador):
+        if "@" in identificador:
+            sql, valor = f"select {COLUNAS_PROFILE_LISTA} from profiles where email = ?", identificador.strip()
+        else:
+            sql = f"select {COLUNAS_PROFILE_LISTA} from profiles where usuario_normalizado = ?"
+            valor = normalizar_usuario(identificador)
+        linhas = self._consultar(sql, (valor,))
+        return linhas[0] if linhas else None
+
+    def pagina_profiles(self, unidade=None, role=None, busca=None, apos=None, limite=50):
+        sql = f"select {COLUNAS_PROFILE_LISTA} from profiles where 1 = 1"
+        params = []
+        if unidade is not None:
+            sql += " and unidade = ?"
+            params.append(unidade)
+        if role is not None:
+            sql += " and role = ?"
+            params.append(role)
+        if apos is not None:
+            sql += " and email > ?"
+            params.append(apos)
+        if busca:
+            padrao = "%" + _escapar_like(busca) + "%"
+            sql += " and (usuario_text like ? escape '\\' or email like ? escape '\\')"
+            params += [padrao, padrao]
+        sql += " order by email limit ?"
+        params.append(limite + 1)
+        return _fatiar_pagina(self._consultar(sql, params), limite)
+
+    def consultar_cota(self, unidade_nome):
+        linhas = self._consultar("""
+            with c as (
+                select coalesce((select plano from unidades where nome = :unidade), 'free') as plano,
+                       count(*) as usuarios,
+                       coalesce(sum(role = 'admin_unidade'), 0) as admins_unidade
+                from profiles where unidade = :unidade
+            )
+            select c.*, l.max_usuarios, l.max_admins_unidade
+            from c left join limites_plano l on l.plano = c.plano
+        """, {"unidade": unidade_nome})
+        return linhas[0]
+
+    def inserir_profile(self, profile):
+        role = profile.get("role", "user")
+        with self._lock:
+            # O lock + transação tornam a conferência da cota e o insert atômicos,
+            # como o trigger profiles_cota_free faz no Postgres
+            with self._conn:
+                if profile.get("unidade") is not None:
+                    motivo = motivo_cota_excedida(self.consultar_cota(profile["unidade"]), role)
+                    if motivo:
+                        raise CotaExcedida(motivo)
+                try:
+                    self._conn.execute(
+                        """insert into profiles (id, email, usuario_text, role, unidade, usuario_normalizado)
+                           values (?, ?, ?, ?, ?, ?)""",
+                        (profile["id"], profile["email"], profile.get("usuario_text"), role,
+                         profile.get("unidade"), normalizar_usuario(profile.get("usuario_text")))
+                    )
+                except sqlite3.IntegrityError as e:
+                    if "usuario_normalizado" in str(e):
+                        raise UsuarioJaExiste(f"Já existe um usuário chamado '{profile.get('usuario_text')}'.") from e
+                    raise
+
+    def excluir_profile(self, user_id):
+        self._executar("delete from profiles where id = ?", (user_id,))
+
+    # Storage
+    def _arquivo(self, path):
+        arquivo = (self.dir_storage / path).resolve()
+        if self.dir_storage not in arquivo.parents:
+            raise ErroRepositorio(f"Caminho fora do storage: {path}")
+        return arquivo
+
+    def listar_objetos(self, pasta, busca=None):
+        diretorio = self._arquivo(pasta) if pasta else self.dir_storage
+        if not diretorio.is_dir():
+            return []
+        return sorted(
+            p.name for p in diretorio.iterdir()
+            if p.is_file() and (not busca or busca in p.name)
+        )
+
+    def enviar_objeto(self, path, dados, content_type, sobrescrever=False):
+        arquivo = self._arquivo(path)
+        if arquivo.exists() and not sobrescrever:
+            raise ObjetoJaExiste(path)
+        arquivo.parent.mkdir(parents=True, exist_ok=True)
+        # Grava em arquivo temporário e renomeia: leitores nunca veem um objeto pela metade
+        temporario = arquivo.with_name(f".{arquivo.name}.{uuid.uuid4().hex}")
+        temporario.write_bytes(dados)
+        os.replace(temporario, arquivo)
+
+    def url_publica(self, path):
+        # st.image aceita caminhos locais
+        return str(self._arquivo(path))
+
+    def caminho_objeto(self, url):
+        if not url or "://" in url:
+            return None
+        try:
+            return self._arquivo(url).relative_to(self.dir_storage).as_posix()
+        except ErroRepositorio:
+            return None
+
+    def iterar_objetos(self, prefixo):
+        raiz = self._arquivo(prefixo) if prefixo.strip("/") else self.dir_storage
+        if not raiz.is_dir():
+            return
+        for pasta, subpastas, arquivos in os.walk(raiz):
+            subpastas.sort()
+            for nome in sorted(arquivos):
+                if nome.startswith("."):
+                    continue  # envio em andamento (ver enviar_objeto)
+                arquivo = Path(pasta) / nome
+                try:
+                    info = arquivo.stat()
+                except FileNotFoundError:
+                    continue
+                yield {
+                    "path": arquivo.relative_to(self.dir_storage).as_posix(),
+                    "tamanho": info.st_size,
+                    "atualizado_em": datetime.datetime.fromtimestamp(info.st_mtime, datetime.timezone.utc),
+                }
+
+    def remover_objetos(self, paths):
+        for path in paths:
+            self._arquivo(path).unlink(missing_ok=True)
+
+    # Auth
+    def autenticar(self, email, senha):
+        linhas = self._consultar("select id, email, senha_hash from usuarios_auth where email = ?", (email,))
+        if not linhas or not _confere_senha(senha, linhas[0]["senha_hash"]):
+            raise ErroRepositorio("Credenciais inválidas.")
+        user = SimpleNamespace(id=linhas[0]["id"], email=linhas[0]["email"])
+        session = SimpleNamespace(access_token=secrets.token_urlsafe(32), user=user)
+        return user, session
+
+    def encerrar_sessao(self, session):
+        pass
+
+    def criar_usuario_auth(self, email, senha, metadados):
+        user_id = str(uuid.uuid4())
+        try:
+            self._executar(
+                "insert into usuarios_auth (id, email, senha_hash, metadados) values (?, ?, ?, ?)",
+                (user_id, email, _hash_senha(senha), json.dumps(metadados))
+            )
+        except sqlite3.IntegrityError:
+            return False, "Erro criando auth user: email já cadastrado."
+        return True, user_id
+
+    def excluir_usuario_auth(self, user_id):
+        self._executar("delete from usuarios_auth where id = ?", (user_id,))
+        return True, ""
+
+
+def criar_repositorio():
+    """Monta o repositório a partir das variáveis de ambiente."""
+    backend = os.getenv("CARDAPIO_BACKEND", "supabase").lower()
+
+    if backend == "sqlite":
+        admin_email = os.getenv("CARDAPIO_ADMIN_EMAIL")
+        admin_senha = os.getenv("CARDAPIO_ADMIN_SENHA")
+        return RepositorioSQLite(
+            os.getenv("CARDAPIO_SQLITE_PATH", "cardapio.db"),
+            os.getenv("CARDAPIO_STORAGE_DIR", "storage"),
+            admin_inicial=(admin_email, admin_senha) if admin_email and admin_senha else None
+        )
+
+    if backend != "supabase":
+        raise ErroConfiguracao(f"CARDAPIO_BACKEND desconhecido: {backend}")
+
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")  # public anon key
+    if not url or not key:
+        raise ErroConfiguracao("SUPABASE_URL e/ou SUPABASE_KEY não configurados.")
+    return RepositorioSupabase(
+        url, key, os.getenv("SERVICE_ROLE_KEY"), os.getenv("SUPABASE_BUCKET", "cardapio"),
+        timeout=float(os.getenv("CARDAPIO_TIMEOUT_SEGUNDOS", "5"))
+    )
@@ -0,0 +1,262 @@
+# --------------------------------------------------------------
+# resiliencia.py — Retentativas, circuit breaker e última cópia boa das leituras
+# --------------------------------------------------------------
+# RepositorioResiliente envolve o repositório real:
+#   - leituras são repetidas com backoff exponencial (com jitter) quando a
+#     falha é de rede/timeout ou sobrecarga (HTTP 502/503/504/429, statement
+#     timeout do Postgres), sem passar do orçamento de tempo por chamada;
+#   - falhas seguidas abrem o circuito: enquanto aberto, nenhuma chamada vai
+#     ao banco (falham na hora); passado o intervalo, uma chamada de teste
+#     decide se ele fecha de novo;
+#   - o resultado de cada leitura de unidades, cardápios e avisos é guardado
+#     num SQLite local; se o banco falhar, a leitura devolve essa cópia e
+#     situacao() passa a descrever o estado para o app avisar o usuário.
+# Escritas não são repetidas (não são idempotentes) e não têm cópia.
+#
+#   CARDAPIO_COPIA_LOCAL         arquivo da cópia local ("" = só em memória)
+#   CARDAPIO_TENTATIVAS          tentativas por leitura
+#   CARDAPIO_ORCAMENTO_LEITURA   segundos por leitura, somando as tentativas
+import datetime
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# Padrões das variáveis acima, lidas nos construtores (depois do load_dotenv do app)
+COPIA_LOCAL = ".copia_local.db"
+TENTATIVAS = 3
+ORCAMENTO_LEITURA = 8.0  # segundos
+BACKOFF_INICIAL = 0.2  # segundos; dobra a cada tentativa
+FALHAS_PARA_ABRIR = 5
+ESPERA_CIRCUITO = 30.0  # segundos com o circuito aberto antes da chamada de teste
+JANELA_AVISO = 60.0  # segundos em que o app segue avisando depois de servir uma cópia
+REGRAVAR_COPIA = 300.0  # segundos até regravar uma cópia sem mudança (atualiza gravado_em)
+
+# Leituras idempotentes, repetidas em falhas transitórias
+LEITURAS = {
+    "listar_unidades", "buscar_unidade", "garantir_unidade",
+    "buscar_cardapios", "buscar_cardapios_intervalo", "buscar_pratos",
+    "pagina_avisos", "avisos_alterados_desde",
+    "buscar_profile", "buscar_profile_login", "pagina_profiles", "consultar_cota",
+    "listar_objetos",
+}
+# Leituras com cópia local (o que um visitante precisa para ver o cardápio).
+# garantir_unidade entra porque toda consulta por unidade começa por ele.
+LEITURAS_COM_COPIA = {
+    "listar_unidades", "buscar_unidade", "garantir_unidade",
+    "buscar_cardapios", "buscar_cardapios_intervalo", "pagina_avisos",
+}
+# Devolvem tupla, que o JSON da cópia transforma em lista
+RETORNAM_TUPLA = {"pagina_avisos"}
+# Não tocam o banco
+LOCAIS = {"url_publica", "caminho_objeto"}
+
+# Falhas de infraestrutura (rede, timeout, banco ocupado). Erros de domínio
+# (ErroRepositorio, violação de constraint, senha errada) não contam para o
+# circuito nem são repetidos.
+_FALHAS_TRANSITORIAS = {"TransportError", "TimeoutException", "OperationalError", "AuthRetryableError"}
+# Erros com resposta do servidor que ainda são de infraestrutura: gateway e
+# limite de requisições (HTTP), PostgREST sem conexão com o banco (PGRST000-2)
+# e statement_timeout do Postgres (57014).
+_CODIGOS_TRANSITORIOS = {"429", "502", "503", "504", "PGRST000", "PGRST001", "PGRST002", "57014"}
+
+
+class CircuitoAberto(Exception):
+    pass
+
+
+def _codigos(erro):
+    """Status HTTP / código de erro que o cliente anexou à exceção.
+
+    postgrest APIError traz `code` (SQLSTATE, PGRSTnnn ou o status HTTP quando
+    a resposta não é JSON); o storage traz `status` ou um dict com statusCode;
+    httpx.HTTPStatusError traz a resposta."""
+    codigos = [getattr(erro, "code", None), getattr(erro, "status", None),
+               getattr(getattr(erro, "response", None), "status_code", None)]
+    if erro.args and isinstance(erro.args[0], dict):
+        dados = erro.args[0]
+        codigos += [dados.get("code"), dados.get("statusCode"), dados.get("status")]
+    return {str(c) for c in codigos if c is not None}
+
+
+def falha_transitoria(erro):
+    if isinstance(erro, (OSError, TimeoutError, ConnectionError)):
+        return True
+    if any(c.__name__ in _FALHAS_TRANSITORIAS for c in type(erro).__mro__):
+        return True
+    return not _codigos(erro).isdisjoint(_CODIGOS_TRANSITORIOS)
+
+
+class Circuito:
+    """Circuit breaker: fechado -> aberto (após N falhas) -> meio-aberto (1 teste)."""
+
+    def __init__(self, limite_falhas=FALHAS_PARA_ABRIR, espera=ESPERA_CIRCUITO):
+        self.limite_falhas = limite_falhas
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+
+    @property
+    def aberto(self):
+        with self._lock:
+            return self._falhas >= self.limite_falhas
+
+    def permitir(self):
+        with self._lock:
+            if self._falhas < self.limite_falhas:
+                return True
+            if time.monotonic() < self._aberto_ate or self._testando:
+                return False
+            self._testando = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+            if self._falhas >= self.limite_falhas:
+                self._aberto_ate = time.monotonic() + self.espera
+
+
+class CopiaLocal:
+    """Último resultado bem-sucedido de cada leitura, por (operação, argumentos).
+
+    Quase toda leitura devolve o mesmo valor da anterior: gravar() só vai ao
+    disco quando o valor muda ou a cópia tem mais de `regravar` segundos."""
+
+    def __init__(self, caminho=None, regravar=REGRAVAR_COPIA):
+        if caminho is None:
+            caminho = os.getenv("CARDAPIO_COPIA_LOCAL", COPIA_LOCAL)
+        self._lock = threading.Lock()
+        self._regravar = regravar
+        self._gravadas = {}  # chave -> (hash do valor, monotonic da gravação)
+        self._conn = sqlite3.connect(caminho or ":memory:", check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("pragma journal_mode=wal")
+            # Com WAL, perder as últimas gravações numa queda de energia só
+            # deixa a cópia um pouco mais velha
+            self._conn.execute("pragma synchronous=normal")
+            self._conn.execute(
+                "create table if not exists leituras (chave text primary key, valor text not null, gravado_em text not null)"
+            )
+
+    def gravar(self, chave, valor):
+        texto = json.dumps(valor, default=str)
+        resumo = hashlib.blake2b(texto.encode(), digest_size=16).digest()
+        agora = time.monotonic()
+        with self._lock:
+            anterior = self._gravadas.get(chave)
+            if anterior and anterior[0] == resumo and agora - anterior[1] < self._regravar:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "insert or replace into leituras (chave, valor, gravado_em) values (?, ?, ?)",
+                    (chave, texto, datetime.datetime.now().isoformat(timespec="seconds"))
+                )
+            self._gravadas[chave] = (resumo, agora)
+
+    def ler(self, chave):
+        """(valor, gravado_em) ou None."""
+        with self._lock:
+            linha = self._conn.execute("select valor, gravado_em from leituras where chave = ?", (chave,)).fetchone()
+        if linha is None:
+            return None
+        return json.loads(linha[0]), datetime.datetime.fromisoformat(linha[1])
+
+
+def _chave(nome, args, kwargs):
+    return f"{nome}:{json.dumps([args, kwargs], default=str, sort_keys=True)}"
+
+
+class RepositorioResiliente:
+    """Envolve um Repositorio com retentativas, circuit breaker e cópia local das leituras."""
+
+    def __init__(self, repo, copia=None, circuito=None, tentativas=None, orcamento=None):
+        self._repo = repo
+        self._copia = copia or CopiaLocal()
+        self._circuito = circuito or Circuito()
+        self._tentativas = tentativas or int(os.getenv("CARDAPIO_TENTATIVAS", TENTATIVAS))
+        self._orcamento = orcamento or float(os.getenv("CARDAPIO_ORCAMENTO_LEITURA", ORCAMENTO_LEITURA))
+        self._lock = threading.Lock()
+        self._copia_servida = None  # (monotonic, gravado_em mais antigo servido no incidente)
+
+    def situacao(self):
+        """None com o banco respondendo; senão, a mensagem de dados possivelmente desatualizados."""
+        with self._lock:
+            servida = self._copia_servida
+            if servida and time.monotonic() - servida[0] > JANELA_AVISO and not self._circuito.aberto:
+                self._copia_servida = servida = None
+        if servida:
+            return (
+                "Sem conexão com o banco de dados: exibindo a última cópia salva "
+                f"(de {servida[1].strftime('%d/%m %H:%M')}), possivelmente desatualizada."
+            )
+        if self._circuito.aberto:
+            return "Sem conexão com o banco de dados: alterações não podem ser salvas no momento."
+        return None
+
+    def _registrar_copia(self, gravado_em):
+        with self._lock:
+            anterior = self._copia_servida[1] if self._copia_servida else gravado_em
+            self._copia_servida = (time.monotonic(), min(anterior, gravado_em))
+
+    def _chamar(self, nome, funcao, args, kwargs):
+        leitura = nome in LEITURAS
+        inicio = time.monotonic()
+        tentativa = 0
+        while True:
+            if not self._circuito.permitir():
+                raise CircuitoAberto(f"{nome}: banco indisponível, tente novamente em instantes.")
+            tentativa += 1
+            try:
+                resultado = funcao(*args, **kwargs)
+            except Exception as e:
+                if not falha_transitoria(e):
+                    self._circuito.sucesso()  # o banco respondeu
+                    raise
+                self._circuito.falha()
+                espera = BACKOFF_INICIAL * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5)
+                if (not leitura or tentativa >= self._tentativas
+                        or time.monotonic() - inicio + espera > self._orcamento):
+                    raise
+                time.sleep(espera)
+            else:
+                self._circuito.sucesso()
+                return resultado
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._repo, nome)
+        if nome.startswith("_") or not callable(atributo) or nome in LOCAIS:
+            return atributo
+
+        def resiliente(*args, **kwargs):
+            if nome not in LEITURAS_COM_COPIA:
+                return self._chamar(nome, atributo, args, kwargs)
+            chave = _chave(nome, args, kwargs)
+            try:
+                resultado = self._chamar(nome, atributo, args, kwargs)
+            except Exception as e:
+                if not (isinstance(e, CircuitoAberto) or falha_transitoria(e)):
+                    raise
+                copia = self._copia.ler(chave)
+                if copia is None:
+                    raise
+                self._registrar_copia(copia[1])
+                return tuple(copia[0]) if nome in RETORNAM_TUPLA else copia[0]
+            try:
+                self._copia.gravar(chave, resultado)
+            except Exception:
+                pass  # a cópia é só um reserva; não atrapalha a leitura
+            return resultado
+
+        return resiliente
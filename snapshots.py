@@ -0,0 +1,159 @@
+# --------------------------------------------------------------
+# snapshots.py — Cardápio da semana pré-renderizado (HTML + JSON)
+# --------------------------------------------------------------
+# Depois de cada salvamento no painel admin e de cada mudança nos avisos (e,
+# para atual.html, na primeira leitura da semana corrente depois da virada),
+# o app grava no storage, por unidade e semana:
+#
+#   snapshots/<unidade>/<semana>.json   dados da semana + avisos vigentes
+#   snapshots/<unidade>/<semana>.html   página autônoma, sem JavaScript
+#   snapshots/<unidade>/atual.html      cópia da semana corrente (TVs, QR code)
+#
+# No Supabase os arquivos ficam no bucket público; no backend SQLite, em
+# CARDAPIO_STORAGE_DIR, prontos para qualquer servidor de arquivos estáticos.
+# Quem só olha o cardápio não precisa abrir uma sessão do Streamlit.
+import base64
+import datetime
+import html
+import json
+import mimetypes
+from pathlib import Path
+
+NOMES_DIAS = {
+    "segunda": "Segunda-feira",
+    "terca": "Terça-feira",
+    "quarta": "Quarta-feira",
+    "quinta": "Quinta-feira",
+    "sexta": "Sexta-feira",
+}
+
+CAMPOS_EXIBIDOS = [
+    ("guarnicao", "Guarnição"),
+    ("proteina", "Prato principal"),
+    ("salada", "Salada"),
+    ("sobremesa", "Sobremesa"),
+]
+
+CSS_SEMANA = """
+.cardapio-semana { font-family: sans-serif; }
+.cardapio-semana h3 { margin: 1.2em 0 0.4em; }
+.cardapio-semana .celula { display: flex; gap: 1em; align-items: flex-start; margin-bottom: 0.8em; }
+.cardapio-semana .celula img { width: 120px; height: 120px; object-fit: cover; border-radius: 6px; }
+.cardapio-semana .celula .sem-foto { width: 120px; flex: none; }
+.cardapio-semana .vazio { font-style: italic; opacity: 0.7; }
+.cardapio-semana .aviso { background: #e8f1fb; border-radius: 6px; padding: 0.6em 1em; margin-bottom: 0.6em; }
+"""
+
+
+def src_embutido(url):
+    """Caminhos locais (backend SQLite) viram data URI; URLs ficam como estão."""
+    if not url or url.startswith(("http://", "https://", "data:")):
+        return url
+    arquivo = Path(url)
+    if not arquivo.is_file():
+        return None
+    tipo = mimetypes.guess_type(arquivo.name)[0] or "application/octet-stream"
+    return f"data:{tipo};base64,{base64.b64encode(arquivo.read_bytes()).decode('ascii')}"
+
+
+def _celula_html(categoria, item, src_imagem):
+    e = html.escape
+    src = src_imagem(item["imagem"]) if item.get("imagem") else None
+    imagem = (
+        f'<img src="{e(src)}" loading="lazy" decoding="async" alt="{e(categoria)}">'
+        if src else '<div class="sem-foto"></div>'
+    )
+    linhas = [f"<strong>{e(categoria)}</strong>"]
+    linhas += [f"<strong>{rotulo}:</strong> {e(item.get(campo) or '')}" for campo, rotulo in CAMPOS_EXIBIDOS]
+    return f'<div class="celula">{imagem}<div>{"<br>".join(linhas)}</div></div>'
+
+
+def renderizar_semana(dados, dias, categorias, avisos=(), src_imagem=src_embutido):
+    """Semana inteira (e avisos) como um único bloco HTML com o CSS embutido.
+
+    `dados` é o {dia: {categoria: item}} de buscar_cardapio_semana; todo texto
+    é escapado. `src_imagem` converte a URL gravada na usada no <img>.
+    """
+    e = html.escape
+    partes = [f"<style>{CSS_SEMANA}</style>", '<div class="cardapio-semana">']
+    for av in avisos:
+        partes.append(f'<div class="aviso"><strong>{e(av["titulo"])}</strong><br>{e(av["mensagem"])}</div>')
+    for d in dias:
+        partes.append(f"<h3>{e(NOMES_DIAS.get(d, d))}</h3>")
+        bloco = dados.get(d, {})
+        if not bloco:
+            partes.append('<p class="vazio">Sem informações cadastradas</p>')
+            continue
+        for c in categorias:
+            item = bloco.get(c)
+            if item:
+                partes.append(_celula_html(c, item, src_imagem))
+            else:
+                partes.append(f'<p>• {e(c)}: <span class="vazio">não definido</span></p>')
+    partes.append("</div>")
+    return "".join(partes)
+
+
+def _pagina_html(unidade, label, corpo, gerado_em):
+    e = html.escape
+    return (
+        '<!DOCTYPE html><html lang="pt-BR"><head><meta charset="utf-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">'
+        f"<title>Cardápio — {e(unidade)}</title></head><body>"
+        f"<h1>📘 Cardápio — {e(unidade)}</h1><h2>📅 {e(label)}</h2>"
+        f"{corpo}<p><small>Atualizado em {e(gerado_em)} (UTC)</small></p></body></html>"
+    )
+
+
+def montar_snapshot(unidade, semana, label, dados, avisos, dias, categorias, src_imagem=None):
+    """Dados públicos da semana, sem versões nem ids internos."""
+    src_imagem = src_imagem or (lambda url: url)
+    return {
+        "unidade": unidade,
+        "semana": semana,
+        "label": label,
+        "gerado_em": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "avisos": [
+            {"titulo": av["titulo"], "mensagem": av["mensagem"], "valido_ate": av.get("valido_ate")}
+            for av in avisos
+        ],
+        "dias": {
+            d: {
+                c: dict(
+                    {campo: item.get(campo) for campo, _ in CAMPOS_EXIBIDOS},
+                    imagem=item.get("imagem"),
+                    miniatura=src_imagem(item["imagem"]) if item.get("imagem") else None
+                )
+                for c, item in dados.get(d, {}).items() if c in categorias
+            }
+            for d in dias
+        },
+    }
+
+
+def caminho_snapshot(pasta, nome):
+    return f"snapshots/{pasta}/{nome}"
+
+
+def publicar_snapshot(repo, pasta, snapshot, dias, categorias, atual=False):
+    """Grava <semana>.json e <semana>.html (e atual.html, se `atual`) no storage.
+
+    As miniaturas entram no HTML como data URI quando são arquivos locais, para
+    que a página funcione copiada para qualquer lugar.
+    """
+    dados = {
+        d: {c: dict(item, imagem=item.get("miniatura")) for c, item in bloco.items()}
+        for d, bloco in snapshot["dias"].items()
+    }
+    corpo = renderizar_semana(dados, dias, categorias, snapshot["avisos"])
+    pagina = _pagina_html(snapshot["unidade"], snapshot["label"], corpo, snapshot["gerado_em"]).encode("utf-8")
+
+    semana = snapshot["semana"]
+    repo.enviar_objeto(caminho_snapshot(pasta, f"{semana}.json"),
+                       json.dumps(snapshot, ensure_ascii=False).encode("utf-8"),
+                       "application/json", sobrescrever=True)
+    repo.enviar_objeto(caminho_snapshot(pasta, f"{semana}.html"), pagina,
+                       "text/html; charset=utf-8", sobrescrever=True)
+    if atual:
+        repo.enviar_objeto(caminho_snapshot(pasta, "atual.html"), pagina,
+                           "text/html; charset=utf-8", sobrescrever=True)
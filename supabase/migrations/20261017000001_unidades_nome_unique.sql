@@ -0,0 +1,4 @@
+-- Nome da unidade passa a ser único: get_unidade_id / criar_unidade usam
+-- upsert com on_conflict="nome" para não criar duplicatas sob concorrência.
+-- Se já existirem nomes repetidos, consolide-os antes de aplicar.
+create unique index if not exists unidades_nome_key on public.unidades (nome);
@@ -0,0 +1,4 @@
+-- Chave natural de um cardápio: permite gravar a semana inteira em um único
+-- upsert (on_conflict="unidade_id,semana_inicio,dia_semana,categoria").
+create unique index if not exists cardapios_unidade_semana_dia_categoria_key
+    on public.cardapios (unidade_id, semana_inicio, dia_semana, categoria);
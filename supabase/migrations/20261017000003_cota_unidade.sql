@@ -0,0 +1,91 @@
+-- Cota de usuários por unidade.
+--
+-- limites_plano é o único lugar dos limites: o trigger confere por ela e o
+-- app lê os mesmos valores por cota_unidade(). Limite null (ou plano sem
+-- linha) = sem limite.
+create table if not exists public.limites_plano (
+    plano text primary key,
+    max_usuarios integer,
+    max_admins_unidade integer
+);
+-- Os limites são públicos (a página "Meu Plano" os mostra); só leitura pela API
+alter table public.limites_plano enable row level security;
+drop policy if exists limites_plano_leitura on public.limites_plano;
+create policy limites_plano_leitura on public.limites_plano for select using (true);
+grant select on public.limites_plano to anon, authenticated;
+
+insert into public.limites_plano (plano, max_usuarios, max_admins_unidade)
+values ('free', 3, 1)
+on conflict (plano) do nothing;
+
+-- cota_unidade: plano, contagens e limites em uma única chamada (rpc), sem
+-- trafegar a lista de profiles só para medir o tamanho. security invoker:
+-- quem chama só conta os profiles que o RLS já lhe mostra.
+drop function if exists public.cota_unidade(text);
+create function public.cota_unidade(p_unidade text)
+returns table (
+    plano text,
+    usuarios bigint,
+    admins_unidade bigint,
+    max_usuarios integer,
+    max_admins_unidade integer
+)
+language sql
+stable
+security invoker
+set search_path = public
+as $$
+    with c as (
+        select
+            coalesce((select u.plano from unidades u where u.nome = p_unidade), 'free') as plano,
+            count(*) as usuarios,
+            count(*) filter (where p.role = 'admin_unidade') as admins_unidade
+        from profiles p
+        where p.unidade = p_unidade
+    )
+    select c.plano, c.usuarios, c.admins_unidade, l.max_usuarios, l.max_admins_unidade
+    from c
+    left join limites_plano l on l.plano = c.plano;
+$$;
+
+create index if not exists profiles_unidade_role_idx on public.profiles (unidade, role);
+
+-- Limites do plano conferidos no próprio insert. O advisory lock por
+-- unidade serializa inserções concorrentes: dois admins criando usuários ao
+-- mesmo tempo não passam juntos do limite. security definer: com o papel de
+-- quem insere, o RLS de profiles esconderia parte das linhas da contagem;
+-- cota_unidade(), chamada daqui, roda com o mesmo papel (o dono da função).
+-- SQLSTATE CA001 é tratado pelo app (repositorio.CotaExcedida).
+create or replace function public.verificar_cota_profile()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_cota record;
+begin
+    if new.unidade is null then
+        return new;
+    end if;
+
+    perform pg_advisory_xact_lock(hashtext('profiles_cota:' || new.unidade));
+
+    select * into v_cota from cota_unidade(new.unidade);
+
+    if v_cota.usuarios >= v_cota.max_usuarios then
+        raise exception 'Limite do plano % alcançado (máx % usuários).', initcap(v_cota.plano), v_cota.max_usuarios
+            using errcode = 'CA001';
+    end if;
+    if new.role = 'admin_unidade' and v_cota.admins_unidade >= v_cota.max_admins_unidade then
+        raise exception 'Plano % permite apenas % admin unidade.', initcap(v_cota.plano), v_cota.max_admins_unidade
+            using errcode = 'CA001';
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists profiles_cota_free on public.profiles;
+create trigger profiles_cota_free
+    before insert on public.profiles
+    for each row execute function public.verificar_cota_profile();
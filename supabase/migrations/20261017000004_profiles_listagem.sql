@@ -0,0 +1,9 @@
+-- Listagem paginada de usuários (tela_usuarios): ordenação/cursor por email
+-- e busca por trecho de usuario_text/email com ilike.
+create extension if not exists pg_trgm;
+
+create index if not exists profiles_email_idx on public.profiles (email);
+create index if not exists profiles_usuario_text_trgm_idx
+    on public.profiles using gin (usuario_text gin_trgm_ops);
+create index if not exists profiles_email_trgm_idx
+    on public.profiles using gin (email gin_trgm_ops);
@@ -0,0 +1,73 @@
+-- Controle de concorrência otimista nos cardápios (tela_admin).
+--
+-- versao começa em 1 e é incrementada a cada update, venha de onde vier
+-- (upsert em lote, importação, edição).
+alter table public.cardapios add column if not exists versao integer not null default 1;
+
+create or replace function public.incrementar_versao_cardapio()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.versao := old.versao + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists cardapios_versao on public.cardapios;
+create trigger cardapios_versao
+    before update on public.cardapios
+    for each row execute function public.incrementar_versao_cardapio();
+
+-- Grava as células alteradas em uma transação. Cada elemento de p_linhas traz
+-- as colunas de cardapios mais "versao_esperada" (null = célula nova). Linhas
+-- cuja versão mudou desde a leitura não são gravadas e voltam com versao null.
+-- As colunas devolvidas têm os nomes das de cardapios (o app lê por nome);
+-- use_column faz os comandos SQL abaixo enxergarem as colunas da tabela.
+create or replace function public.salvar_cardapios_versionados(p_linhas jsonb)
+returns table (semana_inicio date, dia_semana text, categoria text, versao integer)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    l jsonb;
+    r public.cardapios;
+    v_versao integer;
+begin
+    for l in select * from jsonb_array_elements(p_linhas) loop
+        r := jsonb_populate_record(null::public.cardapios, l);
+        v_versao := null;
+
+        if l->>'versao_esperada' is null then
+            insert into public.cardapios as c
+                (unidade_id, semana_inicio, dia_semana, categoria,
+                 guarnicao, proteina, salada, sobremesa, imagem_url, criado_em)
+            values
+                (r.unidade_id, r.semana_inicio, r.dia_semana, r.categoria,
+                 r.guarnicao, r.proteina, r.salada, r.sobremesa, r.imagem_url, r.criado_em)
+            on conflict (unidade_id, semana_inicio, dia_semana, categoria) do nothing
+            returning c.versao into v_versao;
+        else
+            update public.cardapios as c set
+                guarnicao = r.guarnicao,
+                proteina = r.proteina,
+                salada = r.salada,
+                sobremesa = r.sobremesa,
+                imagem_url = r.imagem_url,
+                criado_em = r.criado_em
+            where c.unidade_id = r.unidade_id
+              and c.semana_inicio = r.semana_inicio
+              and c.dia_semana = r.dia_semana
+              and c.categoria = r.categoria
+              and c.versao = (l->>'versao_esperada')::integer
+            returning c.versao into v_versao;
+        end if;
+
+        semana_inicio := r.semana_inicio;
+        dia_semana := r.dia_semana;
+        categoria := r.categoria;
+        versao := v_versao;
+        return next;
+    end loop;
+end;
+$$;
@@ -0,0 +1,21 @@
+-- Feed de alterações dos avisos (FeedAvisos no app): cada processo consulta
+-- periodicamente só os avisos com atualizado_em recente.
+alter table public.avisos
+    add column if not exists atualizado_em timestamptz not null default now();
+
+create or replace function public.tocar_atualizado_em()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.atualizado_em := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists avisos_atualizado_em on public.avisos;
+create trigger avisos_atualizado_em
+    before update on public.avisos
+    for each row execute function public.tocar_atualizado_em();
+
+create index if not exists avisos_atualizado_em_idx on public.avisos (atualizado_em);
@@ -0,0 +1,40 @@
+-- Avisos com validade: valido_ate (opcional) tira o aviso do cardápio no dia
+-- seguinte e arquivar_avisos_expirados() o desativa de vez. A leitura é
+-- paginada (criado_em desc, id desc: cursor pelas duas colunas, para não
+-- pular avisos com o mesmo criado_em) e usa o índice parcial só dos ativos.
+alter table public.avisos
+    add column if not exists valido_ate date,
+    add column if not exists arquivado_em timestamptz;
+
+create index if not exists avisos_ativos_unidade_idx
+    on public.avisos (unidade_id, criado_em desc, id desc)
+    where ativo;
+
+-- security definer: o app a chama com a chave anon, e o RLS de avisos não
+-- deixaria esse papel atualizar as linhas (o update não faria nada). Só
+-- desativa avisos já vencidos, então pode ser chamada por qualquer um.
+create or replace function public.arquivar_avisos_expirados()
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with arquivados as (
+        update public.avisos
+           set ativo = false, arquivado_em = now()
+         where ativo and valido_ate < current_date
+        returning 1
+    )
+    select count(*)::integer from arquivados;
+$$;
+
+-- Com pg_cron disponível, arquiva uma vez por dia no próprio banco; sem ele,
+-- o FeedAvisos do app chama a função periodicamente.
+do $$
+begin
+    if exists (select 1 from pg_extension where extname = 'pg_cron') then
+        perform cron.schedule('arquivar-avisos-expirados', '5 3 * * *',
+                              'select public.arquivar_avisos_expirados()');
+    end if;
+end;
+$$;
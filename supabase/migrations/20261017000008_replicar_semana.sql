@@ -0,0 +1,58 @@
+-- Replica uma semana de cardápio (com as imagens) para várias unidades e/ou
+-- semanas em um único insert ... select. p_origem e cada elemento de
+-- p_destinos trazem {"unidade_id", "semana_inicio"}. Sem p_sobrescrever,
+-- células já preenchidas no destino são mantidas. Devolve as linhas gravadas.
+create or replace function public.replicar_semana(
+    p_origem jsonb,
+    p_destinos jsonb,
+    p_sobrescrever boolean default false
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_origem public.cardapios := jsonb_populate_record(null::public.cardapios, p_origem);
+    v_gravadas integer;
+begin
+    if p_sobrescrever then
+        insert into public.cardapios
+            (unidade_id, semana_inicio, dia_semana, categoria,
+             guarnicao, proteina, salada, sobremesa, imagem_url, criado_em)
+        select d.unidade_id, d.semana_inicio, o.dia_semana, o.categoria,
+               o.guarnicao, o.proteina, o.salada, o.sobremesa, o.imagem_url, now()
+        from (
+            select distinct r.unidade_id, r.semana_inicio
+            from jsonb_array_elements(p_destinos) e,
+                 jsonb_populate_record(null::public.cardapios, e.value) r
+        ) d
+        join public.cardapios o
+          on o.unidade_id = v_origem.unidade_id and o.semana_inicio = v_origem.semana_inicio
+        where (d.unidade_id, d.semana_inicio) is distinct from (v_origem.unidade_id, v_origem.semana_inicio)
+        on conflict (unidade_id, semana_inicio, dia_semana, categoria) do update set
+            guarnicao = excluded.guarnicao,
+            proteina = excluded.proteina,
+            salada = excluded.salada,
+            sobremesa = excluded.sobremesa,
+            imagem_url = excluded.imagem_url,
+            criado_em = excluded.criado_em;
+    else
+        insert into public.cardapios
+            (unidade_id, semana_inicio, dia_semana, categoria,
+             guarnicao, proteina, salada, sobremesa, imagem_url, criado_em)
+        select d.unidade_id, d.semana_inicio, o.dia_semana, o.categoria,
+               o.guarnicao, o.proteina, o.salada, o.sobremesa, o.imagem_url, now()
+        from (
+            select distinct r.unidade_id, r.semana_inicio
+            from jsonb_array_elements(p_destinos) e,
+                 jsonb_populate_record(null::public.cardapios, e.value) r
+        ) d
+        join public.cardapios o
+          on o.unidade_id = v_origem.unidade_id and o.semana_inicio = v_origem.semana_inicio
+        where (d.unidade_id, d.semana_inicio) is distinct from (v_origem.unidade_id, v_origem.semana_inicio)
+        on conflict (unidade_id, semana_inicio, dia_semana, categoria) do nothing;
+    end if;
+
+    get diagnostics v_gravadas = row_count;
+    return v_gravadas;
+end;
+$$;
@@ -0,0 +1,79 @@
+-- Login por nome de usuário: igualdade numa coluna normalizada com índice
+-- único, em vez de ilike sem âncora em usuario_text (que varria a tabela e
+-- tratava % e _ como curingas). No Supabase a chave é sempre calculada aqui
+-- (trigger e buscar_profile_login); repositorio.normalizar_usuario() só vale
+-- para o backend SQLite.
+create extension if not exists unaccent with schema extensions;
+
+create or replace function public.normalizar_usuario(p_texto text)
+returns text
+language sql
+immutable
+as $$
+    select nullif(
+        lower(regexp_replace(btrim(extensions.unaccent('extensions.unaccent'::regdictionary, p_texto)), '\s+', ' ', 'g')),
+        ''
+    );
+$$;
+
+alter table public.profiles add column if not exists usuario_normalizado text;
+
+create or replace function public.tocar_usuario_normalizado()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.usuario_normalizado := public.normalizar_usuario(new.usuario_text);
+    return new;
+end;
+$$;
+
+drop trigger if exists profiles_usuario_normalizado on public.profiles;
+create trigger profiles_usuario_normalizado
+    before insert or update of usuario_text on public.profiles
+    for each row execute function public.tocar_usuario_normalizado();
+
+update public.profiles
+   set usuario_normalizado = public.normalizar_usuario(usuario_text)
+ where usuario_normalizado is distinct from public.normalizar_usuario(usuario_text);
+
+-- Com o ilike, nomes repetidos passavam despercebidos; aqui eles precisam
+-- ser resolvidos (renomeando um dos usuários) antes do índice único.
+do $$
+declare
+    v_repetidos text;
+begin
+    select string_agg(usuario_normalizado, ', ') into v_repetidos
+    from (
+        select usuario_normalizado from public.profiles
+        where usuario_normalizado is not null
+        group by usuario_normalizado having count(*) > 1
+    ) r;
+    if v_repetidos is not null then
+        raise exception 'Nomes de usuário repetidos (renomeie antes de migrar): %', v_repetidos;
+    end if;
+end;
+$$;
+
+create unique index if not exists profiles_usuario_normalizado_idx
+    on public.profiles (usuario_normalizado);
+
+-- Login por nome de usuário: o nome digitado é normalizado aqui, pela mesma
+-- função do trigger. O unaccent translitera letras que a normalização NFD do
+-- app mantém (ø, ß, æ, ł...), então a chave não pode ser calculada no Python.
+create or replace function public.buscar_profile_login(p_usuario text)
+returns table (
+    id public.profiles.id%type,
+    email public.profiles.email%type,
+    usuario_text public.profiles.usuario_text%type,
+    role public.profiles.role%type,
+    unidade public.profiles.unidade%type
+)
+language sql
+stable
+as $$
+    select p.id, p.email, p.usuario_text, p.role, p.unidade
+    from public.profiles p
+    where p.usuario_normalizado = public.normalizar_usuario(p_usuario)
+    limit 1;
+$$;
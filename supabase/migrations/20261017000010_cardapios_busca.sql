@@ -0,0 +1,146 @@
+-- Busca de pratos no histórico (todas as semanas e unidades). Uma coluna
+-- gerada guarda guarnição, prato principal, salada e sobremesa normalizados
+-- (sem acentos, minúsculas) como tsvector, com índice GIN; cada palavra
+-- buscada casa como início de palavra ("feij" acha "Feijoada"), como no FTS5
+-- do backend SQLite. O unaccent também translitera letras que a normalização
+-- do app mantém (ø, ß, æ...); termo e texto são normalizados aqui, no banco.
+create extension if not exists unaccent with schema extensions;
+
+create or replace function public.normalizar_texto(p_texto text)
+returns text
+language sql
+immutable
+as $$
+    select nullif(
+        lower(regexp_replace(btrim(extensions.unaccent('extensions.unaccent'::regdictionary, p_texto)), '\s+', ' ', 'g')),
+        ''
+    );
+$$;
+
+create or replace function public.normalizar_usuario(p_texto text)
+returns text
+language sql
+immutable
+as $$
+    select public.normalizar_texto(p_texto);
+$$;
+
+-- Coluna gerada exige expressão imutável: || com coalesce em vez de concat_ws
+-- (que é só stable); os espaços a mais somem em normalizar_texto()
+alter table public.cardapios add column if not exists busca tsvector
+    generated always as (
+        to_tsvector('simple'::regconfig, coalesce(public.normalizar_texto(
+            coalesce(guarnicao, '') || ' ' || coalesce(proteina, '') || ' ' ||
+            coalesce(salada, '') || ' ' || coalesce(sobremesa, '')
+        ), ''))
+    ) stored;
+
+create index if not exists cardapios_busca_idx on public.cardapios using gin (busca);
+-- Ordem dos resultados (semanas mais novas primeiro), com e sem filtro de unidade
+create index if not exists cardapios_semana_id_idx on public.cardapios (semana_inicio desc, id desc);
+create index if not exists cardapios_unidade_semana_id_idx
+    on public.cardapios (unidade_id, semana_inicio desc, id desc);
+
+-- Uma página de resultados, mais recentes primeiro, só com as colunas exibidas
+-- (repositorio.COLUNAS_PRATO_BUSCA). p_apos é o cursor {"semana_inicio", "id"}
+-- da última linha da página anterior. As colunas devolvidas têm os nomes das
+-- de cardapios; por isso toda referência à tabela abaixo é qualificada.
+--
+-- O planner não estima bem a frequência de prefixos ("feij:*") e escolhia o
+-- índice ordenado também para termos raros, lendo a tabela inteira. A busca
+-- é feita em duas etapas, sem depender dessa estimativa:
+--   1. as c_janela linhas mais novas, pelo índice ordenado: termos comuns
+--      enchem a página aqui;
+--   2. se faltar, as linhas mais antigas que a janela, pelo índice GIN:
+--      termos raros casam poucas linhas.
+drop function if exists public.buscar_pratos(text, bigint, jsonb, integer);
+create function public.buscar_pratos(
+    p_termo text,
+    p_unidade_id public.cardapios.unidade_id%type default null,
+    p_apos jsonb default null,
+    p_limite integer default 20
+)
+returns table (
+    id public.cardapios.id%type,
+    unidade_id public.cardapios.unidade_id%type,
+    semana_inicio public.cardapios.semana_inicio%type,
+    dia_semana public.cardapios.dia_semana%type,
+    categoria public.cardapios.categoria%type,
+    guarnicao public.cardapios.guarnicao%type,
+    proteina public.cardapios.proteina%type,
+    salada public.cardapios.salada%type,
+    sobremesa public.cardapios.sobremesa%type
+)
+language plpgsql
+stable
+-- Planos por chamada: os filtros opcionais (unidade, cursor) mudam o índice certo
+set plan_cache_mode = force_custom_plan
+as $$
+#variable_conflict use_column
+declare
+    c_janela constant integer := 5000;
+    v_apos public.cardapios := jsonb_populate_record(null::public.cardapios, coalesce(p_apos, '{}'::jsonb));
+    v_limite integer := least(greatest(p_limite, 1), 101);
+    v_consulta tsquery;
+    v_fim public.cardapios;
+    v_encontradas integer;
+begin
+    -- Só letras e dígitos chegam à tsquery: nada do usuário vira operador
+    select to_tsquery('simple', string_agg(palavra || ':*', ' & '))
+      into v_consulta
+      from regexp_split_to_table(public.normalizar_texto(p_termo), '[^[:alnum:]]+') as palavra
+     where palavra <> '';
+
+    if v_consulta is null then
+        return;
+    end if;
+
+    return query
+        select c.id, c.unidade_id, c.semana_inicio, c.dia_semana, c.categoria,
+               c.guarnicao, c.proteina, c.salada, c.sobremesa
+        from (
+            select c.*
+            from public.cardapios c
+            where (p_unidade_id is null or c.unidade_id = p_unidade_id)
+              and (p_apos is null or (c.semana_inicio, c.id) < (v_apos.semana_inicio, v_apos.id))
+            order by c.semana_inicio desc, c.id desc
+            limit c_janela
+        ) c
+        where c.busca @@ v_consulta
+        order by c.semana_inicio desc, c.id desc
+        limit v_limite;
+
+    get diagnostics v_encontradas = row_count;
+    if v_encontradas >= v_limite then
+        return;
+    end if;
+
+    -- Última linha da janela; sem ela, a janela já percorreu tudo
+    select c.* into v_fim
+      from public.cardapios c
+     where (p_unidade_id is null or c.unidade_id = p_unidade_id)
+       and (p_apos is null or (c.semana_inicio, c.id) < (v_apos.semana_inicio, v_apos.id))
+     order by c.semana_inicio desc, c.id desc
+     offset c_janela - 1
+     limit 1;
+    if not found then
+        return;
+    end if;
+
+    -- materialized: a busca vai ao índice GIN e só as linhas achadas são ordenadas
+    return query
+        with achadas as materialized (
+            select c.id, c.unidade_id, c.semana_inicio, c.dia_semana, c.categoria,
+                   c.guarnicao, c.proteina, c.salada, c.sobremesa
+            from public.cardapios c
+            where c.busca @@ v_consulta
+        )
+        select a.id, a.unidade_id, a.semana_inicio, a.dia_semana, a.categoria,
+               a.guarnicao, a.proteina, a.salada, a.sobremesa
+        from achadas a
+        where (p_unidade_id is null or a.unidade_id = p_unidade_id)
+          and (a.semana_inicio, a.id) < (v_fim.semana_inicio, v_fim.id)
+        order by a.semana_inicio desc, a.id desc
+        limit v_limite - v_encontradas;
+end;
+$$;